@@ -0,0 +1,139 @@
+"""
+Bounded, compacting message history for the reflection loop.
+
+Resending every code version and every critique on each refine makes prompt
+tokens grow quadratically with the number of iterations. `ReflectionHistory`
+keeps only what the refine step needs: the original task, the latest code, the
+latest critique, and a rolling summary of older critiques, trimmed to a token
+budget; oversized code is truncated so the latest critique always keeps room.
+`TokenLedger` records per-call token usage so the cost curve can be checked.
+"""
+from typing import Callable, Dict, List, Optional
+
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token estimate (~4 characters per token for English text)."""
+    return max(1, len(text) // 4)
+
+
+def _message_tokens(messages: List[BaseMessage]) -> int:
+    return sum(estimate_tokens(str(m.content)) for m in messages)
+
+
+def _truncate(text: str, max_tokens: int) -> str:
+    max_chars = max(0, max_tokens * 4)
+    if len(text) <= max_chars:
+        return text
+    return text[:max_chars].rstrip() + "\n[...truncated]"
+
+
+def summarize_critiques(critiques: List[str], max_tokens: int) -> str:
+    """
+    Local, extractive summary of older critiques: their unique bullet points,
+    newest first, until `max_tokens` is used. Needs no extra model call.
+    """
+    seen = set()
+    points = []
+    for critique in reversed(critiques):
+        for line in critique.splitlines():
+            point = line.strip().lstrip("-*•0123456789. ").strip()
+            if point and point.lower() not in seen:
+                seen.add(point.lower())
+                points.append(f"- {point}")
+    return _truncate("\n".join(points), max_tokens)
+
+
+class ReflectionHistory:
+    """
+    The prompt state for the generate/refine step, kept under a token budget.
+    Args:
+        task_prompt: The original task; always sent in full.
+        token_budget: Target size of the refine prompt in (estimated) tokens.
+        summarize: Function (critiques, max_tokens) -> summary used for older
+            critiques. Defaults to the local `summarize_critiques`; pass an
+            LLM-backed function for abstractive summaries.
+        min_critique_tokens: Tokens kept for the latest critique even when the
+            code is large; the code is truncated to make room.
+            Defaults to a quarter of `token_budget`.
+    """
+
+    def __init__(self, task_prompt: str, token_budget: int = 3000,
+                 summarize: Optional[Callable[[List[str], int], str]] = None,
+                 min_critique_tokens: Optional[int] = None):
+        self.task_prompt = task_prompt
+        self.token_budget = token_budget
+        self.summarize = summarize or summarize_critiques
+        self.min_critique_tokens = token_budget // 4 if min_critique_tokens is None else min_critique_tokens
+        self.latest_code: Optional[str] = None
+        self.latest_critique: Optional[str] = None
+        self.older_critiques: List[str] = []
+
+    def add_code(self, code: str) -> None:
+        self.latest_code = code
+
+    def add_critique(self, critique: str) -> None:
+        if self.latest_critique is not None:
+            self.older_critiques.append(self.latest_critique)
+        self.latest_critique = critique
+
+    def messages(self) -> List[BaseMessage]:
+        """Build the refine (or initial generate) prompt within the token budget."""
+        task = HumanMessage(content=self.task_prompt)
+        if self.latest_code is None:
+            return [task]
+
+        instruction = HumanMessage(content="Please refine the code using the critiques provided.")
+        remaining = self.token_budget - _message_tokens([task, instruction])
+
+        # Room for the latest critique is reserved first, so oversized code is
+        # truncated instead of squeezing out the feedback the refine step needs.
+        reserve = min(estimate_tokens(self.latest_critique or ""), self.min_critique_tokens)
+        code = _truncate(self.latest_code, max(remaining - reserve, self.min_critique_tokens))
+        fixed = [task, AIMessage(content=code)]
+        remaining -= _message_tokens(fixed[1:])
+
+        # The latest critique gets priority; older critiques share what is left.
+        critique_text = _truncate(self.latest_critique or "", max(remaining, reserve))
+        critique = HumanMessage(content=f"Critique of the previous code:\n{critique_text}")
+        remaining -= _message_tokens([critique])
+
+        summary = []
+        if self.older_critiques and remaining > 50:
+            text = self.summarize(self.older_critiques, remaining)
+            if text:
+                summary = [HumanMessage(content=f"Summary of earlier critiques (already addressed or still open):\n{text}")]
+        return fixed + summary + [critique, instruction]
+
+
+class TokenLedger:
+    """Per-call token accounting for the reflection loop."""
+
+    def __init__(self):
+        self.entries: List[Dict] = []
+
+    def record(self, iteration: int, stage: str, prompt: List[BaseMessage], response) -> None:
+        """Record estimated prompt size and, when the model reports it, actual usage."""
+        usage = getattr(response, "usage_metadata", None) or {}
+        self.entries.append({
+            "iteration": iteration,
+            "stage": stage,
+            "estimated_prompt_tokens": _message_tokens(prompt),
+            "input_tokens": usage.get("input_tokens"),
+            "output_tokens": usage.get("output_tokens"),
+        })
+
+    def summary(self) -> str:
+        lines = [f"{'iter':>4}  {'stage':<8}{'est. prompt':>12}{'input':>8}{'output':>8}"]
+        total_in = total_out = 0
+        for e in self.entries:
+            total_in += e["input_tokens"] or e["estimated_prompt_tokens"]
+            total_out += e["output_tokens"] or 0
+            lines.append(
+                f"{e['iteration']:>4}  {e['stage']:<8}{e['estimated_prompt_tokens']:>12}"
+                f"{e['input_tokens'] if e['input_tokens'] is not None else '-':>8}"
+                f"{e['output_tokens'] if e['output_tokens'] is not None else '-':>8}"
+            )
+        lines.append(f"Total: ~{total_in} input tokens, {total_out} output tokens over {len(self.entries)} calls")
+        return "\n".join(lines)
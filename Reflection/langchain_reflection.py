@@ -1,7 +1,13 @@
 import os
+import re
+import time
+import asyncio
 from dotenv import load_dotenv
 from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain_core.messages import SystemMessage, HumanMessage
+from history import ReflectionHistory, TokenLedger
+from verifier import verify_code
+from model_health import ModelHealthCache, plan_startup, probe_in_background, OK, NOT_FOUND, ERROR
 
 # Optional: import the specific exception class used in your traceback
 try:
@@ -22,20 +28,89 @@ MODEL_CANDIDATES = [
     "gemini-1.5-flash",   # keep the old one as a last resort
 ]
 
+# Probe results are cached on disk so startup doesn't re-probe every model.
+model_health = ModelHealthCache(
+    os.getenv("MODEL_HEALTH_CACHE", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".model_health.json")),
+    ttl_seconds=float(os.getenv("MODEL_HEALTH_TTL", str(6 * 3600))),
+)
+
+def probe_model(model_name, temperature=0.1):
+    """
+    Create a ChatGoogleGenerativeAI for `model_name`, verify it answers, and record the result.
+    Returns the `llm` instance, or raises the probe's exception.
+    """
+    try:
+        llm = ChatGoogleGenerativeAI(model=model_name, temperature=temperature)
+        # Do a lightweight probe call to verify model availability.
+        # Use a tiny prompt so we confirm the model responds before running the full loop.
+        probe = [HumanMessage(content="Say 'ok'")]
+        llm.invoke(probe)
+    except Exception as e:
+        is_not_found = GoogleNotFound is not None and isinstance(e, GoogleNotFound)
+        model_health.record(model_name, NOT_FOUND if is_not_found else ERROR, f"{type(e).__name__}: {e}")
+        raise
+    model_health.record(model_name, OK)
+    return llm
+
+class ModelCallError(RuntimeError):
+    """A call to the model itself failed (as opposed to a bug in the loop or the verifier)."""
+
+class TrackedLLM:
+    """Wraps a chat model so that only failures of its own calls surface as ModelCallError."""
+
+    def __init__(self, llm):
+        self.llm = llm
+
+    def invoke(self, *args, **kwargs):
+        try:
+            return self.llm.invoke(*args, **kwargs)
+        except Exception as e:
+            raise ModelCallError(f"{type(e).__name__}: {e}") from e
+
+    async def ainvoke(self, *args, **kwargs):
+        try:
+            return await self.llm.ainvoke(*args, **kwargs)
+        except Exception as e:
+            raise ModelCallError(f"{type(e).__name__}: {e}") from e
+
+def report_model_failure(model_name, error, candidates=None, temperature=0.1):
+    """
+    Mark a model whose calls failed during real use so the next start doesn't trust it,
+    then probe the other candidates in order, synchronously.
+    Returns:
+        (llm, model_name) for the first candidate that answers, or (None, None).
+    """
+    model_health.record(model_name, ERROR, f"{type(error).__name__}: {error}")
+    for candidate in candidates or []:
+        if candidate == model_name:
+            continue
+        print(f"Trying fallback model: {candidate} ...")
+        try:
+            return probe_model(candidate, temperature), candidate
+        except Exception as e:
+            print(f"Failed to use model '{candidate}': {type(e).__name__}: {e}")
+    return None, None
+
 def get_working_llm(candidates, temperature=0.1):
     """
-    Try to create a ChatGoogleGenerativeAI for each candidate model.
-    Return the first working `llm` instance. If none work, raise RuntimeError.
+    Return the first working `llm` instance from `candidates`. If none work, raise RuntimeError.
+    A model the health cache knows to be good is used immediately without a probe call;
+    stale cache entries are refreshed in the background. Only when the cache has no
+    known-good model are candidates probed synchronously, as before.
     """
+    chosen, reprobe, probe_now = plan_startup(model_health, list(candidates))
+    if chosen is not None:
+        print(f"Model '{chosen}' is known to be available (cached) — using it.\n")
+        if reprobe:
+            print(f"Re-probing in the background: {', '.join(reprobe)}")
+            probe_in_background(reprobe, lambda m: probe_model(m, temperature))
+        return ChatGoogleGenerativeAI(model=chosen, temperature=temperature), chosen
+
     last_exception = None
-    for model_name in candidates:
+    for model_name in probe_now:
         print(f"Trying model: {model_name} ...")
         try:
-            llm = ChatGoogleGenerativeAI(model=model_name, temperature=temperature)
-            # Do a lightweight probe call to verify model availability.
-            # Use a tiny prompt so we confirm the model responds before running the full loop.
-            probe = [HumanMessage(content="Say 'ok'")]
-            resp = llm.invoke(probe)
+            llm = probe_model(model_name, temperature)
             # If we get here without raising, model works
             print(f"Model '{model_name}' appears to be available — using it.\n")
             return llm, model_name
@@ -61,11 +136,7 @@ def get_working_llm(candidates, temperature=0.1):
     )
     raise RuntimeError(msg)
 
-def run_reflection_loop(llm):
-    """
-    Demonstrates a multi-step AI reflection loop to progressively improve a Python function.
-    """
-    task_prompt = """
+TASK_PROMPT = """
     Your task is to create a Python function named `calculate_factorial`.
     This function should do the following:
     1. Accept a single integer `n` as input.
@@ -75,42 +146,106 @@ def run_reflection_loop(llm):
     5. Handle invalid input: Raise a ValueError if the input is a negative number.
     """
 
-    max_iterations = 3
+# Test cases derived from the task's requirements, checked locally by the verifier.
+TASK_TESTS = [
+    {"expr": "calculate_factorial(0)", "expect": 1},   # 4. factorial of 0 is 1
+    {"expr": "calculate_factorial(1)", "expect": 1},
+    {"expr": "calculate_factorial(5)", "expect": 120},  # 2. computes n!
+    {"expr": "calculate_factorial(10)", "expect": 3628800},
+    {"expr": "calculate_factorial(-1)", "raises": "ValueError"},  # 5. negative input
+    {"expr": "bool((calculate_factorial.__doc__ or '').strip())", "expect": True},  # 3. docstring
+]
+
+REFLECTOR_SYSTEM_PROMPT = """
+                You are a senior software engineer and an expert in Python.
+                Your role is to perform a meticulous code review.
+                Critically evaluate the provided Python code based on the original task requirements.
+                Look for bugs, style issues, missing edge cases, and areas for improvement.
+                If the code is perfect and meets all requirements, respond with the single phrase 'CODE_IS_PERFECT'.
+                Otherwise, provide a bulleted list of your critiques.
+            """
+
+# Used when several candidates must be compared: the reflector also scores the code.
+SCORING_INSTRUCTION = """
+                Unless the code is perfect, begin your response with a line of the form 'SCORE: <0-10>'
+                rating how well the code meets the task, then give the bulleted list.
+            """
+
+def reflector_prompt_for(task_prompt, code, scored=False):
+    """Build the reviewer prompt for one piece of code."""
+    system = REFLECTOR_SYSTEM_PROMPT + (SCORING_INSTRUCTION if scored else "")
+    return [
+        SystemMessage(content=system),
+        HumanMessage(content=f"Original Task:\n{task_prompt}\n\nCode to Review:\n{code}")
+    ]
+
+def parse_score(critique):
+    """Extract the reviewer's score; CODE_IS_PERFECT counts as 10, a missing score as 0."""
+    if "CODE_IS_PERFECT" in critique:
+        return 10.0
+    match = re.search(r"SCORE:\s*(\d+(?:\.\d+)?)", critique)
+    return float(match.group(1)) if match else 0.0
+
+def run_reflection_loop(llm, max_iterations=3, history_token_budget=3000,
+                        verify=True, style_review=True, explain_failures=False):
+    """
+    Demonstrates a multi-step AI reflection loop to progressively improve a Python function.
+    The refine prompt only carries the task, the latest code, the latest critique and a
+    summary of older critiques (capped at `history_token_budget`), so its size stays flat
+    as iterations grow. Token usage per call is printed at the end.
+
+    With `verify`, each version is first run locally against TASK_TESTS. Failing code gets
+    the test report as its critique without an LLM call (unless `explain_failures`, which
+    asks the reflector to explain the failures); passing code is sent to the reflector only
+    for a style review (`style_review`), otherwise the loop stops.
+    """
+    task_prompt = TASK_PROMPT
+    start = time.perf_counter()
+    iterations = 0
+
     current_code = ""
-    message_history = [HumanMessage(content=task_prompt)]
+    history = ReflectionHistory(task_prompt, token_budget=history_token_budget)
+    ledger = TokenLedger()
+    reflector_calls_saved = 0
 
     for i in range(max_iterations):
         print("\n" + "=" * 25 + f" REFLECTION LOOP: ITERATION {i + 1} " + "=" * 25)
+        iterations = i + 1
 
         # --- 1. GENERATE / REFINE STAGE ---
         if i == 0:
             print("\n>>> STAGE 1: GENERATING initial code...")
-            response = llm.invoke(message_history)
-            current_code = response.content
         else:
             print("\n>>> STAGE 1: REFINING code based on previous critique...")
-            message_history.append(HumanMessage(content="Please refine the code using the critiques provided."))
-            response = llm.invoke(message_history)
-            current_code = response.content
+        generate_prompt = history.messages()
+        response = llm.invoke(generate_prompt)
+        ledger.record(i + 1, "generate", generate_prompt, response)
+        current_code = response.content
 
         print("\n--- Generated Code (v" + str(i + 1) + ") ---\n" + current_code)
-        message_history.append(response)
+        history.add_code(current_code)
 
-        # --- 2. REFLECT STAGE ---
-        print("\n>>> STAGE 2: REFLECTING on the generated code...")
-        reflector_prompt = [
-            SystemMessage(content="""
-                You are a senior software engineer and an expert in Python.
-                Your role is to perform a meticulous code review.
-                Critically evaluate the provided Python code based on the original task requirements.
-                Look for bugs, style issues, missing edge cases, and areas for improvement.
-                If the code is perfect and meets all requirements, respond with the single phrase 'CODE_IS_PERFECT'.
-                Otherwise, provide a bulleted list of your critiques.
-            """),
-            HumanMessage(content=f"Original Task:\n{task_prompt}\n\nCode to Review:\n{current_code}")
-        ]
+        # --- 2a. VERIFY STAGE (local) ---
+        if verify:
+            verification = verify_code(current_code, TASK_TESTS)
+            print(f"\n>>> STAGE 2a: VERIFYING locally ({verification.seconds * 1000:.0f} ms)...\n{verification.report()}")
+            if not verification.passed and not explain_failures:
+                reflector_calls_saved += 1
+                history.add_critique(verification.report())
+                continue
+            if verification.passed and not style_review:
+                reflector_calls_saved += 1
+                print("\nLocal tests passed; skipping the LLM review.")
+                break
 
+        # --- 2b. REFLECT STAGE ---
+        print("\n>>> STAGE 2: REFLECTING on the generated code...")
+        reflector_prompt = reflector_prompt_for(task_prompt, current_code)
+        if verify and not verification.passed:
+            reflector_prompt.append(HumanMessage(
+                content=f"{verification.report()}\nExplain the cause of each failure and how to fix it."))
         critique_response = llm.invoke(reflector_prompt)
+        ledger.record(i + 1, "reflect", reflector_prompt, critique_response)
         critique = critique_response.content
 
         if "CODE_IS_PERFECT" in critique:
@@ -118,12 +253,112 @@ def run_reflection_loop(llm):
             break
 
         print("\n--- Critique ---\n" + critique)
-        message_history.append(HumanMessage(content=f"Critique of the previous code:\n{critique}"))
+        history.add_critique(critique)
 
     print("\n" + "=" * 30 + " FINAL RESULT " + "=" * 30)
     print("\nFinal refined code after the reflection process:\n")
     print(current_code)
 
+    print("\n--- Token Usage ---")
+    print(ledger.summary())
+    if verify:
+        print(f"Reflector calls avoided by local verification: {reflector_calls_saved}")
+    return {"code": current_code, "iterations": iterations, "seconds": time.perf_counter() - start}
+
+async def _critique_candidates(llm, task_prompt, candidates, iteration, ledger):
+    """
+    Critique every candidate concurrently. Returns (index, critique) pairs in completion
+    order, stopping early (and cancelling the rest) as soon as one is CODE_IS_PERFECT.
+    """
+    async def critique(index):
+        prompt = reflector_prompt_for(task_prompt, candidates[index], scored=True)
+        response = await llm.ainvoke(prompt)
+        ledger.record(iteration, "reflect", prompt, response)
+        return index, response.content
+
+    tasks = [asyncio.create_task(critique(i)) for i in range(len(candidates))]
+    results = []
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            index, text = await next_done
+            results.append((index, text))
+            if "CODE_IS_PERFECT" in text:
+                break
+    finally:
+        for task in tasks:
+            task.cancel()
+    return results
+
+async def run_best_of_n_reflection_loop(llm, n_candidates=3, max_iterations=3,
+                                        history_token_budget=3000, candidate_llm=None):
+    """
+    Reflection loop that generates `n_candidates` versions per iteration concurrently,
+    critiques them concurrently, and advances only the best-scored one. Stops as soon
+    as any critique returns CODE_IS_PERFECT.
+    Args:
+        llm: Model used for critiques (and for candidates if `candidate_llm` is None).
+        n_candidates: Candidates generated per iteration.
+        max_iterations: Upper bound on generate/critique rounds.
+        history_token_budget: Token budget for the refine prompt.
+        candidate_llm: Optional higher-temperature model for more diverse candidates.
+    Returns:
+        A dict with the final code, the iterations used and the wall-clock seconds.
+    """
+    task_prompt = TASK_PROMPT
+    candidate_llm = candidate_llm or llm
+    history = ReflectionHistory(task_prompt, token_budget=history_token_budget)
+    ledger = TokenLedger()
+    start = time.perf_counter()
+    best_code = ""
+    iterations = 0
+
+    for i in range(max_iterations):
+        iterations = i + 1
+        print("\n" + "=" * 20 + f" BEST-OF-{n_candidates} LOOP: ITERATION {i + 1} " + "=" * 20)
+
+        # --- 1. GENERATE N candidates concurrently ---
+        generate_prompt = history.messages()
+        responses = await asyncio.gather(*[candidate_llm.ainvoke(generate_prompt) for _ in range(n_candidates)])
+        for response in responses:
+            ledger.record(i + 1, "generate", generate_prompt, response)
+        candidates = [response.content for response in responses]
+
+        # --- 2. CRITIQUE all candidates concurrently ---
+        critiques = await _critique_candidates(llm, task_prompt, candidates, i + 1, ledger)
+        best_index, best_critique = max(critiques, key=lambda item: parse_score(item[1]))
+        best_code = candidates[best_index]
+        scores = ", ".join(f"#{index + 1}={parse_score(text):g}" for index, text in critiques)
+        print(f"\n--- Scores: {scores} -> advancing candidate #{best_index + 1} ---\n{best_code}")
+
+        if "CODE_IS_PERFECT" in best_critique:
+            print("\n--- Critique ---\nNo further critiques found. The code is satisfactory.")
+            break
+
+        print("\n--- Critique ---\n" + best_critique)
+        history.add_code(best_code)
+        history.add_critique(best_critique)
+
+    print("\n" + "=" * 30 + " FINAL RESULT " + "=" * 30)
+    print(best_code)
+    print("\n--- Token Usage ---")
+    print(ledger.summary())
+    return {"code": best_code, "iterations": iterations, "seconds": time.perf_counter() - start}
+
+def compare_reflection_modes(llm, n_candidates=3, max_iterations=3, candidate_llm=None):
+    """
+    Run the serial and best-of-N loops and report wall-clock time and iterations used.
+    Best-of-N has no local verifier, so the serial loop runs without one too (LLM critique only).
+    """
+    serial = run_reflection_loop(llm, max_iterations=max_iterations, verify=False)
+    best_of_n = asyncio.run(run_best_of_n_reflection_loop(
+        llm, n_candidates=n_candidates, max_iterations=max_iterations, candidate_llm=candidate_llm))
+    print("\n" + "=" * 30 + " COMPARISON " + "=" * 30)
+    print(f"Serial loop:     {serial['iterations']} iterations, {serial['seconds']:.1f}s")
+    print(f"Best-of-{n_candidates} loop:  {best_of_n['iterations']} iterations, {best_of_n['seconds']:.1f}s")
+    print(f"Iterations saved: {serial['iterations'] - best_of_n['iterations']}, "
+          f"wall-clock difference: {serial['seconds'] - best_of_n['seconds']:+.1f}s")
+    return serial, best_of_n
+
 
 if __name__ == "__main__":
     # Get a working LLM (tries candidates)
@@ -136,5 +371,29 @@ if __name__ == "__main__":
         print(str(exc))
         raise SystemExit(1)
 
-    # Run your loop
-    run_reflection_loop(llm)
+    # Run your loop. REFLECTION_MODE: 'serial' (default), 'best_of_n', or 'compare'.
+    mode = os.getenv("REFLECTION_MODE", "serial")
+    n_candidates = int(os.getenv("REFLECTION_CANDIDATES", "3"))
+
+    def run_mode(llm, model_name):
+        # Only failures of the model calls are wrapped, so local bugs are never blamed on the model.
+        llm = TrackedLLM(llm)
+        if mode == "best_of_n":
+            candidate_llm = TrackedLLM(ChatGoogleGenerativeAI(model=model_name, temperature=0.7))
+            asyncio.run(run_best_of_n_reflection_loop(llm, n_candidates=n_candidates, candidate_llm=candidate_llm))
+        elif mode == "compare":
+            candidate_llm = TrackedLLM(ChatGoogleGenerativeAI(model=model_name, temperature=0.7))
+            compare_reflection_modes(llm, n_candidates=n_candidates, candidate_llm=candidate_llm)
+        else:
+            run_reflection_loop(llm)
+
+    try:
+        run_mode(llm, used_model)
+    except ModelCallError as exc:
+        # Don't trust the cached choice next time, and retry once on the next working candidate.
+        print(f"\nModel '{used_model}' failed during the run: {exc}")
+        llm, used_model = report_model_failure(used_model, exc.__cause__ or exc, MODEL_CANDIDATES)
+        if llm is None:
+            raise
+        print(f"Falling back to model: {used_model}")
+        run_mode(llm, used_model)
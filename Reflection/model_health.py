@@ -0,0 +1,121 @@
+"""
+Persisted model-health cache for picking a working Gemini model at startup.
+
+Probing every candidate model with a real request on each start adds one or
+more round trips before any work begins. `ModelHealthCache` records which
+models answered ("ok") or were missing ("not_found") in a small JSON file with
+a TTL, so startup can pick a known-good model instantly. Expired entries are
+refreshed by a background probe instead of blocking startup.
+"""
+import json
+import os
+import tempfile
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional
+
+OK = "ok"
+NOT_FOUND = "not_found"
+ERROR = "error"
+
+
+class ModelHealthCache:
+    """
+    JSON-file cache of model probe results.
+    Args:
+        path: File the cache is persisted to.
+        ttl_seconds: How long a probe result is trusted before it is refreshed.
+    """
+
+    def __init__(self, path: str, ttl_seconds: float = 6 * 3600):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._entries: Dict[str, Dict] = self._load()
+
+    def _load(self) -> Dict[str, Dict]:
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            return data if isinstance(data, dict) else {}
+        except (OSError, ValueError):
+            return {}
+
+    def _save(self) -> None:
+        # Write to a temp file and rename, so a crash never leaves a half-written cache.
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(self._entries, f, indent=2)
+        os.replace(tmp_path, self.path)
+
+    def get(self, model_name: str) -> Optional[Dict]:
+        """Return the cached entry (with an added `fresh` flag), or None if never probed."""
+        with self._lock:
+            entry = self._entries.get(model_name)
+            if entry is None:
+                return None
+            fresh = time.time() - entry.get("checked_at", 0) < self.ttl_seconds
+            return dict(entry, fresh=fresh)
+
+    def record(self, model_name: str, status: str, error: Optional[str] = None) -> None:
+        """Store a probe (or usage) result for `model_name` and persist the cache."""
+        with self._lock:
+            self._entries[model_name] = {"status": status, "checked_at": time.time(), "error": error}
+            try:
+                self._save()
+            except OSError as e:
+                print(f"Could not write model health cache '{self.path}': {e}")
+
+
+def probe_in_background(models: Iterable[str], probe: Callable[[str], object]) -> threading.Thread:
+    """
+    Re-probe `models` on a daemon thread; `probe` records its own results.
+    Returns:
+        The started thread (callers normally don't need to join it).
+    """
+    models = list(models)
+
+    def run() -> None:
+        for model_name in models:
+            try:
+                probe(model_name)
+            except Exception:
+                pass  # The probe records failures itself.
+
+    thread = threading.Thread(target=run, name="model-health-probe", daemon=True)
+    thread.start()
+    return thread
+
+
+def plan_startup(cache: ModelHealthCache, candidates: List[str]):
+    """
+    Decide from the cache alone which model to use and what to re-probe.
+    Returns:
+        (chosen_model or None, models_to_reprobe_in_background, models_to_probe_now)
+        If a known-good model exists it is chosen immediately, and any stale or
+        unknown candidates ranked above it (plus itself, if stale) are re-probed
+        in the background. Otherwise every candidate not freshly known to be
+        missing (404) must be probed synchronously.
+    """
+    background = []
+    for model_name in candidates:
+        entry = cache.get(model_name)
+        if entry is None:
+            background.append(model_name)
+            continue
+        if entry["status"] == OK:
+            if not entry["fresh"]:
+                background.append(model_name)
+            return model_name, background, []
+        if not entry["fresh"]:
+            background.append(model_name)
+
+    def known_missing(model_name: str) -> bool:
+        entry = cache.get(model_name)
+        return entry is not None and entry["fresh"] and entry["status"] == NOT_FOUND
+
+    # If the cache says every candidate is missing, it may be wrong; probe them all.
+    probe_now = [m for m in candidates if not known_missing(m)] or list(candidates)
+    return None, [], probe_now
@@ -0,0 +1,142 @@
+"""
+Local, execution-based verifier for generated code.
+
+Most reflection iterations only need to know whether the code works, and that
+can be checked locally in milliseconds instead of with an LLM round trip.
+`verify_code` extracts the code block from a model response, runs it in a
+separate Python process (isolated mode, throwaway working directory, no stdin,
+CPU / memory / process-count / wall-clock limits) against task-derived test
+cases, and reports which cases failed.
+
+This is resource containment, not a security boundary: only run code from
+models you already trust to run on this machine.
+"""
+import json
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List, Optional
+
+try:
+    import resource
+except ImportError:  # Not available on Windows; limits are then wall-clock only.
+    resource = None
+
+_CODE_BLOCK = re.compile(r"```(?:python|py)?\s*\n(.*?)```", re.DOTALL)
+
+# Runs inside the child process: executes the candidate code, then each test.
+_HARNESS = r'''
+import json, sys
+tests = json.loads(sys.argv[2])
+namespace = {"__name__": "candidate"}
+results = []
+try:
+    with open(sys.argv[1], encoding="utf-8") as f:
+        exec(compile(f.read(), "candidate.py", "exec"), namespace)
+except BaseException as e:
+    print(json.dumps({"error": f"Code failed to load: {type(e).__name__}: {e}"}))
+    sys.exit(0)
+for test in tests:
+    entry = {"expr": test["expr"]}
+    try:
+        value = eval(test["expr"], namespace)
+        if "raises" in test:
+            entry["ok"] = False
+            entry["detail"] = f"expected {test['raises']} but got {value!r}"
+        else:
+            entry["ok"] = value == test["expect"]
+            if not entry["ok"]:
+                entry["detail"] = f"expected {test['expect']!r} but got {value!r}"
+    except BaseException as e:
+        if test.get("raises") == type(e).__name__:
+            entry["ok"] = True
+        else:
+            entry["ok"] = False
+            entry["detail"] = f"raised {type(e).__name__}: {e}"
+    results.append(entry)
+print(json.dumps({"results": results}))
+'''
+
+
+class VerificationResult:
+    """Outcome of running generated code against local test cases."""
+
+    def __init__(self, passed: bool, failures: List[str], error: Optional[str], seconds: float):
+        self.passed = passed
+        self.failures = failures
+        self.error = error
+        self.seconds = seconds
+
+    def report(self) -> str:
+        """A critique-style bulleted report of what failed."""
+        if self.passed:
+            return "All local tests passed."
+        lines = [f"- {self.error}"] if self.error else []
+        lines += [f"- {failure}" for failure in self.failures]
+        return "The code failed local tests:\n" + "\n".join(lines)
+
+
+def extract_code(response_text: str) -> str:
+    """Return the first fenced Python block in a model response, or the text itself."""
+    match = _CODE_BLOCK.search(response_text)
+    return (match.group(1) if match else response_text).strip()
+
+
+def _limit_resources(cpu_seconds: int, memory_mb: int):
+    def apply() -> None:
+        resource.setrlimit(resource.RLIMIT_CPU, (cpu_seconds, cpu_seconds))
+        memory = memory_mb * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (memory, memory))
+        resource.setrlimit(resource.RLIMIT_FSIZE, (1024 * 1024, 1024 * 1024))
+        if hasattr(resource, "RLIMIT_NPROC"):
+            # No new processes (or threads), so a fork bomb can't escape the limits above.
+            resource.setrlimit(resource.RLIMIT_NPROC, (0, 0))
+    return apply
+
+
+def verify_code(response_text: str, tests: List[Dict], timeout: float = 5.0,
+                memory_mb: int = 256) -> VerificationResult:
+    """
+    Run the code in `response_text` against `tests` in a resource-limited subprocess.
+    Args:
+        response_text: Model output containing the code (fenced or bare).
+        tests: Test cases like {"expr": "f(3)", "expect": 6} or {"expr": "f(-1)", "raises": "ValueError"}.
+        timeout: Wall-clock limit in seconds.
+        memory_mb: Address-space limit for the child process.
+    Returns:
+        A VerificationResult.
+    """
+    code = extract_code(response_text)
+    start = time.perf_counter()
+    with tempfile.TemporaryDirectory() as workdir:
+        code_path = os.path.join(workdir, "candidate.py")
+        with open(code_path, "w", encoding="utf-8") as f:
+            f.write(code)
+        try:
+            completed = subprocess.run(
+                [sys.executable, "-I", "-c", _HARNESS, code_path, json.dumps(tests)],
+                cwd=workdir,
+                env={"PATH": os.environ.get("PATH", "")},
+                stdin=subprocess.DEVNULL,  # input() in generated code fails fast instead of reading the terminal.
+                capture_output=True,
+                text=True,
+                timeout=timeout,
+                preexec_fn=_limit_resources(int(timeout) + 1, memory_mb) if resource else None,
+            )
+        except subprocess.TimeoutExpired:
+            return VerificationResult(False, [], f"Timed out after {timeout:g}s", time.perf_counter() - start)
+    seconds = time.perf_counter() - start
+
+    try:
+        output = json.loads(completed.stdout.strip().splitlines()[-1])
+    except (IndexError, ValueError):
+        detail = completed.stderr.strip().splitlines()[-1:] or [f"exit code {completed.returncode}"]
+        return VerificationResult(False, [], f"Verifier crashed: {detail[0]}", seconds)
+    if "error" in output:
+        return VerificationResult(False, [], output["error"], seconds)
+
+    failures = [f"{r['expr']}: {r['detail']}" for r in output["results"] if not r["ok"]]
+    return VerificationResult(not failures, failures, None, seconds)
@@ -5,15 +5,17 @@
 # See the LICENSE file in the repository for the full license text.
 
 import os
-import uuid
 from typing import Dict, Any, Optional
 from dotenv import load_dotenv
 from google.adk.agents import Agent
-from google.adk.runners import InMemoryRunner
+from google.adk.runners import Runner
 from google.adk.tools import FunctionTool
 from google.genai import types
 from google.adk.events import Event
 
+from direct_dispatch import DirectDispatcher
+from session_store import DEFAULT_DB_PATH, BatchedSqliteSessionService, get_or_create_user_session
+
 # Load environment variables
 load_dotenv()
 
@@ -54,26 +56,50 @@ booking_tool = FunctionTool(booking_handler)
 info_tool = FunctionTool(info_handler)
 unclear_tool = FunctionTool(unclear_handler)
 
-# Define specialized sub-agents equipped with their respective tools
+# --- Direct Dispatch ---
+# Each specialist is a thin wrapper around one tool, so when the route is known
+# locally (cached LLM decision or confident keyword match) the Coordinator's
+# before_agent_callback calls the tool itself and skips every model call.
+# Set ADK_DIRECT_DISPATCH=0 to always delegate through the LLM.
+dispatcher = DirectDispatcher(
+    handlers={"Booker": booking_handler, "Info": info_handler, "Unclear": unclear_handler},
+    threshold=float(os.getenv("ADK_DIRECT_DISPATCH_THRESHOLD", "0.75")),
+)
+DIRECT_DISPATCH = os.getenv("ADK_DIRECT_DISPATCH", "1") == "1"
+
+# Define specialized sub-agents equipped with their respective tools.
+# They never transfer on their own, so every new request starts at the Coordinator.
 booking_agent = Agent(
     name="Booker",
     model="gemini-2.0-flash",
     description="A specialized agent that handles all flight and hotel booking requests by calling the booking tool.",
-    tools=[booking_tool]
+    tools=[booking_tool],
+    disallow_transfer_to_parent=True,
+    disallow_transfer_to_peers=True,
+    before_agent_callback=dispatcher.record_delegation,
+    before_model_callback=dispatcher.count_model_call,
 )
 
 info_agent = Agent(
     name="Info",
     model="gemini-2.0-flash",
     description="A specialized agent that provides general information and answers user questions by calling the info tool.",
-    tools=[info_tool]
+    tools=[info_tool],
+    disallow_transfer_to_parent=True,
+    disallow_transfer_to_peers=True,
+    before_agent_callback=dispatcher.record_delegation,
+    before_model_callback=dispatcher.count_model_call,
 )
 
 unclear_agent = Agent(
     name="Unclear",
     model="gemini-2.0-flash",
     description="A specialized agent that handles unclear requests by calling the unclear tool.",
-    tools=[unclear_tool]
+    tools=[unclear_tool],
+    disallow_transfer_to_parent=True,
+    disallow_transfer_to_peers=True,
+    before_agent_callback=dispatcher.record_delegation,
+    before_model_callback=dispatcher.count_model_call,
 )
 
 # Define the parent agent with explicit delegation instructions
@@ -90,50 +116,55 @@ coordinator = Agent(
     ),
     description="A coordinator that routes user requests to the correct specialist agent.",
     # The presence of sub_agents enables LLM-driven delegation (Auto-Flow) by default.
-    sub_agents=[booking_agent, info_agent,unclear_agent]
+    sub_agents=[booking_agent, info_agent,unclear_agent],
+    before_agent_callback=dispatcher.before_coordinator if DIRECT_DISPATCH else None,
+    before_model_callback=dispatcher.count_model_call,
 )
 
 # --- Execution Logic ---
-async def run_coordinator(runner: InMemoryRunner, request: str):
+async def run_coordinator(runner: Runner, request: str, user_id: str = "user_123"):
     """Runs the coordinator agent with a given request and delegates."""
     print(f"\n--- Running Coordinator with request: '{request}' ---")
     final_result = ""
     try:
-        user_id = "user_123"
-        session_id = str(uuid.uuid4())
-        await runner.session_service.create_session(
-            app_name=runner.app_name, user_id=user_id, session_id=session_id
-        )
-        for event in runner.run(
+        # Reuse the user's session instead of creating a new one per request.
+        session = await get_or_create_user_session(runner.session_service, runner.app_name, user_id)
+        events = runner.run_async(
             user_id=user_id,
-            session_id=session_id,
+            session_id=session.id,
             new_message=types.Content(
                 role='user',
                 parts=[types.Part(text=request)]
             ),
-        ):
-            if event.is_final_response() and event.content:
-                # Try to get text directly from event.content
-                # to avoid iterating parts
-                if hasattr(event.content, 'text') and event.content.text:
-                    final_result = event.content.text
-                elif event.content.parts:
-                    # Fallback: Iterate through parts and extract text (might trigger warning)
+        )
+        try:
+            async for event in events:
+                if event.is_final_response() and event.content and event.content.parts:
                     text_parts = [part.text for part in event.content.parts if part.text]
                     final_result = "".join(text_parts)
-                # Assuming the loop should break after the final response
-                break
+                    # Assuming the loop should break after the final response
+                    break
+        finally:
+            await events.aclose()
         print(f"Coordinator Final Response: {final_result}")
         return final_result
     except Exception as e:
         print(f"An error occurred while processing your request: {e}")
         return f"An error occurred while processing your request: {e}"
 
+def create_runner(db_path: Optional[str] = None) -> Runner:
+    """Runner whose sessions persist in SQLite (ADK_SESSION_DB) across restarts."""
+    session_service = BatchedSqliteSessionService(
+        db_path or os.getenv("ADK_SESSION_DB", DEFAULT_DB_PATH),
+        ttl_seconds=float(os.getenv("ADK_SESSION_TTL", str(7 * 24 * 3600))),
+    )
+    return Runner(agent=coordinator, app_name="adk_routing", session_service=session_service)
+
 async def main():
     """Main function to run the ADK example."""
     print("--- Google ADK Routing Example (ADK Auto-Flow Style) ---")
     print("Note: This requires Google ADK installed and authenticated.")
-    runner = InMemoryRunner(coordinator)
+    runner = create_runner()
     
     # Example Usage
     result_a = await run_coordinator(runner, "Book me a hotel in Paris.")
@@ -150,9 +181,11 @@ async def main():
     
     result_e = await run_coordinator(runner, "hello")  # Should go to Unclear
     print(f"Final Output E: {result_e}")
+    
+    await runner.close()
+    print(f"Session store: {runner.session_service.stats()}")
+    print(dispatcher.report())
 
 if __name__ == "__main__":
     import asyncio
-    import nest_asyncio
-    nest_asyncio.apply()
     asyncio.run(main())
\ No newline at end of file
@@ -0,0 +1,105 @@
+"""
+Wall-clock benchmark of the research fan-out against a stub model (no API key or network).
+
+`StubLlm` is a BaseLlm that sleeps for a fixed latency plus a per-prompt-size
+cost (a merger asked to synthesize more summaries writes a longer answer, so it
+takes longer, as with a real model), echoes a
+short summary, and tracks how many calls are in flight at once. The benchmark
+builds the flat pipeline (`build_research_pipeline`) and the tree-merge
+pipeline (`build_tree_research_pipeline`) over N generated topics at several
+concurrency caps and reports wall-clock time and peak in-flight model calls.
+
+Usage:
+    python bench_fanout.py [model_latency_ms] [topic_counts comma-separated] [caps comma-separated] [group_size]
+"""
+import asyncio
+import logging
+import sys
+import uuid
+import warnings
+
+from google.adk.models.base_llm import BaseLlm
+from google.adk.models.llm_response import LlmResponse
+from google.adk.runners import InMemoryRunner
+from google.genai import types
+
+from parallel_google_adk import (
+    build_research_pipeline, build_tree_research_pipeline, pipeline_output_keys, stream_pipeline,
+)
+
+
+class StubLlm(BaseLlm):
+    """Stand-in for Gemini with latency growing with prompt size; records peak concurrency."""
+
+    # A gemini-* name keeps the google_search tool accepted by ADK.
+    model: str = "gemini-2.0-flash"
+    latency: float = 0.2
+    seconds_per_kchar: float = 0.25
+    calls: int = 0
+    in_flight: int = 0
+    peak_in_flight: int = 0
+
+    async def generate_content_async(self, llm_request, stream: bool = False):
+        self.calls += 1
+        self.in_flight += 1
+        self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        instruction = llm_request.config.system_instruction if llm_request.config else None
+        prompt_chars = len(str(instruction or ""))
+        try:
+            await asyncio.sleep(self.latency + prompt_chars / 1000 * self.seconds_per_kchar)
+        finally:
+            self.in_flight -= 1
+        yield LlmResponse(content=types.Content(
+            role="model", parts=[types.Part(text=f"Stub summary #{self.calls}.")]
+        ))
+
+
+async def time_pipeline(pipeline, model: StubLlm) -> dict:
+    runner = InMemoryRunner(pipeline, app_name="bench")
+    session = await runner.session_service.create_session(
+        app_name="bench", user_id="bench", session_id=str(uuid.uuid4())
+    )
+    outcome = await stream_pipeline(
+        runner, "bench", session.id, "Start the research pipeline",
+        output_keys=pipeline_output_keys(pipeline), final_author=pipeline.sub_agents[-1].name,
+    )
+    return {
+        "seconds": outcome["seconds"],
+        "researched": sum(1 for key in outcome["results"] if key.startswith("topic_")),
+        "calls": model.calls,
+        "peak": model.peak_in_flight,
+        "report": outcome["report"],
+    }
+
+
+async def run_benchmark(latency: float = 0.2, topic_counts=(3, 10, 25, 50, 100), caps=(None, 10),
+                        group_size: int = 5):
+    print(f"Stub model latency {latency * 1e3:.0f} ms + {StubLlm().seconds_per_kchar * 1e3:.0f} ms per 1k prompt chars")
+    print(f"{'topics':>6} {'cap':>5} {'merge':>6} {'stages':>6} {'wall s':>7} {'calls':>5} {'peak calls':>10}")
+    for n in topic_counts:
+        topics = [f"benchmark topic {i}" for i in range(n)]
+        for cap in caps:
+            for merge in ("flat", "tree"):
+                model = StubLlm(latency=latency)
+                if merge == "flat":
+                    pipeline = build_research_pipeline(topics, max_concurrency=cap or n, model=model)
+                else:
+                    pipeline = build_tree_research_pipeline(topics, group_size=group_size,
+                                                            max_concurrency=cap or n, model=model)
+                result = await time_pipeline(pipeline, model)
+                assert result["researched"] == n and result["report"], f"{merge} run for {n} topics is incomplete"
+                print(f"{n:>6} {cap or 'none':>5} {merge:>6} {len(pipeline.sub_agents):>6} {result['seconds']:>7.2f} "
+                      f"{result['calls']:>5} {result['peak']:>10}")
+
+
+if __name__ == "__main__":
+    warnings.filterwarnings("ignore")
+    # ADK logs a warning per stub response about missing token usage.
+    logging.disable(logging.WARNING)
+    args = sys.argv[1:]
+    asyncio.run(run_benchmark(
+        latency=float(args[0]) / 1e3 if len(args) > 0 else 0.2,
+        topic_counts=tuple(int(n) for n in args[1].split(",")) if len(args) > 1 else (3, 10, 25, 50, 100),
+        caps=tuple(int(c) for c in args[2].split(",")) if len(args) > 2 else (None, 10),
+        group_size=int(args[3]) if len(args) > 3 else 5,
+    ))
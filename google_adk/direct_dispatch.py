@@ -0,0 +1,179 @@
+"""
+Direct dispatch for the ADK routing Coordinator.
+
+Without it every request costs at least three model calls before a simulated
+handler runs: the Coordinator picks a sub-agent, the sub-agent calls its tool,
+and the sub-agent phrases the tool result. `DirectDispatcher` installs a
+`before_agent_callback` on the Coordinator that routes the request locally:
+
+1. A decision cache (normalized request -> sub-agent) filled from earlier LLM
+   delegations answers repeated requests.
+2. Otherwise a keyword classifier scores the request; when it is confident
+   enough the request is dispatched without any model call.
+
+When the chosen sub-agent is a thin wrapper around one tool, the tool function
+is called directly and its result returned as the Coordinator's response, which
+ends the invocation. Anything else falls through to normal LLM delegation, and
+the sub-agent the LLM picks is cached for next time. Model calls are counted
+with a `before_model_callback`, so `report()` shows measured savings.
+"""
+import re
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, Optional, Tuple
+
+from google.genai import types
+
+_PUNCTUATION = re.compile(r"[^\w\s]")
+_WHITESPACE = re.compile(r"\s+")
+_PENDING_KEY = "temp:direct_dispatch_request"
+
+# Keyword rules per sub-agent; a request scores one point per matching pattern.
+DEFAULT_RULES: Dict[str, Tuple[str, ...]] = {
+    "Booker": (r"\bbook", r"\breserv", r"\bflights?\b", r"\bhotels?\b", r"\btickets?\b",
+               r"\bfly\b", r"\bcheck[- ]?in\b", r"\bcancel\b"),
+    "Info": (r"^(what|who|when|where|why|how|which)\b", r"\bwhat(?:'s| is| are)\b", r"\bfacts?\b",
+             r"\bexplain\b", r"\btell me (?:about|a|something)\b", r"\?$", r"\bhighest\b|\blargest\b|\bcapital\b"),
+    "Unclear": (r"^(hi|hello|hey|thanks|thank you|ok|okay|yo)\W*$",),
+}
+# Matching patterns needed for full confidence. One keyword alone ("How are you")
+# is too weak to skip the LLM, but a bare greeting is unambiguous.
+MIN_MATCHES: Dict[str, int] = {"Booker": 2, "Info": 2, "Unclear": 1}
+
+
+def normalize_request(request: str) -> str:
+    """Lowercase, strip punctuation and collapse whitespace (the cache key)."""
+    return _WHITESPACE.sub(" ", _PUNCTUATION.sub(" ", request.lower())).strip()
+
+
+def classify_request(request: str, rules: Dict[str, Tuple[str, ...]] = DEFAULT_RULES,
+                     min_matches: Dict[str, int] = MIN_MATCHES) -> Tuple[Optional[str], float]:
+    """
+    Score `request` against the keyword rules.
+    Returns:
+        (agent name, confidence in [0, 1]); (None, 0.0) when no rule matches.
+        Confidence is the winner's share of all matches, scaled down when fewer
+        than `min_matches` of its patterns matched (1 of 2 gives at most 0.5).
+    """
+    text = request.strip().lower()
+    scores = {name: sum(1 for p in patterns if re.search(p, text)) for name, patterns in rules.items()}
+    best = max(scores, key=scores.get)
+    total = sum(scores.values())
+    if not scores[best]:
+        return None, 0.0
+    confidence = scores[best] / total
+    return best, confidence * min(1.0, scores[best] / min_matches.get(best, 1))
+
+
+class DirectDispatcher:
+    """
+    Pre-delegation hook for a routing coordinator.
+    Args:
+        handlers: Sub-agent name -> the tool function it wraps. Sub-agents listed
+            here are thin wrappers and are bypassed entirely when dispatched.
+        threshold: Minimum classifier confidence for a local decision.
+        cache_size: Maximum cached LLM routing decisions (LRU).
+        model_calls_per_delegation: Model calls an LLM delegation costs, used
+            for the savings estimate until delegations have been measured.
+    """
+
+    def __init__(self, handlers: Dict[str, Callable[[str], str]], threshold: float = 0.75,
+                 cache_size: int = 10000, model_calls_per_delegation: int = 3,
+                 rules: Dict[str, Tuple[str, ...]] = DEFAULT_RULES):
+        self.handlers = handlers
+        self.threshold = threshold
+        self.cache_size = cache_size
+        self.rules = rules
+        self.default_calls_per_delegation = model_calls_per_delegation
+        self._cache: "OrderedDict[str, str]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.requests = 0
+        self.dispatched = {"cache": 0, "classifier": 0}
+        self.delegated = 0
+        # Only delegated requests reach a model, so this is also the cost of delegation.
+        self.model_calls = 0
+
+    # --- Decision cache ---
+    def _cached(self, key: str) -> Optional[str]:
+        with self._lock:
+            label = self._cache.get(key)
+            if label is not None:
+                self._cache.move_to_end(key)
+            return label
+
+    def _remember(self, key: str, label: str) -> None:
+        with self._lock:
+            self._cache[key] = label
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def decide(self, request: str) -> Tuple[Optional[str], str]:
+        """Return (sub-agent name or None, source) without calling a model."""
+        label = self._cached(normalize_request(request))
+        if label is not None:
+            return label, "cache"
+        label, confidence = classify_request(request, self.rules)
+        if label is not None and confidence >= self.threshold:
+            return label, "classifier"
+        return None, "llm"
+
+    # --- ADK callbacks ---
+    def before_coordinator(self, callback_context) -> Optional[types.Content]:
+        """before_agent_callback for the Coordinator: answer directly when the route is known."""
+        content = callback_context.user_content
+        request = "".join(p.text for p in (content.parts if content else []) if p.text).strip()
+        if not request:
+            return None
+        self.requests += 1
+        label, source = self.decide(request)
+        if label is None or label not in self.handlers:
+            # Fall through to LLM delegation; remember its choice for this request.
+            self.delegated += 1
+            callback_context.state[_PENDING_KEY] = normalize_request(request)
+            return None
+        self.dispatched[source] += 1
+        print(f"Direct dispatch ({source}) -> {label}")
+        result = self.handlers[label](request)
+        return types.Content(role="model", parts=[types.Part(text=str(result))])
+
+    def record_delegation(self, callback_context) -> None:
+        """before_agent_callback for sub-agents: cache the route the LLM chose."""
+        key = callback_context.state.get(_PENDING_KEY)
+        if key:
+            self._remember(key, callback_context.agent_name)
+            callback_context.state[_PENDING_KEY] = ""
+        return None
+
+    def count_model_call(self, callback_context, llm_request) -> None:
+        """before_model_callback for every routing agent: counts model calls."""
+        with self._lock:
+            self.model_calls += 1
+        return None
+
+    # --- Reporting ---
+    def stats(self) -> Dict[str, float]:
+        dispatched = sum(self.dispatched.values())
+        if self.delegated:
+            per_delegation = self.model_calls / self.delegated
+        else:
+            per_delegation = float(self.default_calls_per_delegation)
+        return {
+            "requests": self.requests,
+            "dispatched_cache": self.dispatched["cache"],
+            "dispatched_classifier": self.dispatched["classifier"],
+            "delegated": self.delegated,
+            "model_calls": self.model_calls,
+            "model_calls_per_delegation": round(per_delegation, 2),
+            "model_calls_saved": round(dispatched * per_delegation, 1),
+        }
+
+    def report(self) -> str:
+        s = self.stats()
+        without = s["model_calls"] + s["model_calls_saved"]
+        saved_share = (s["model_calls_saved"] / without * 100) if without else 0.0
+        return (f"Direct dispatch: {s['dispatched_cache'] + s['dispatched_classifier']}/{s['requests']} requests "
+                f"({s['dispatched_cache']} cached, {s['dispatched_classifier']} classified), "
+                f"{s['delegated']} delegated by LLM; {s['model_calls']} model calls made, "
+                f"~{s['model_calls_saved']:g} saved ({saved_share:.0f}%)")
@@ -1,176 +1,384 @@
 import os
+import re
 import asyncio
-import uuid
+import time
 from dotenv import load_dotenv
 from google.adk.agents import LlmAgent, ParallelAgent, SequentialAgent
 from google.adk.tools import google_search
-from google.adk.runners import InMemoryRunner
+from google.adk.runners import Runner
 from google.genai import types
 
+from session_store import DEFAULT_DB_PATH, BatchedSqliteSessionService
+
 # Load environment variables
 load_dotenv()
 os.environ['GOOGLE_API_KEY'] = os.getenv('GOOGLE_API_KEY', '')
  
 GEMINI_MODEL = "gemini-2.0-flash"
 
-# --- 1. Define Researcher Sub-Agents (to run in parallel) ---
-# Researcher 1: Renewable Energy
-researcher_agent_1 = LlmAgent(
-    name="RenewableEnergyResearcher",
-    model=GEMINI_MODEL,
-    instruction="""You are an AI Research Assistant specializing in energy.
-Research the latest advancements in 'renewable energy sources'.
-Use the Google Search tool provided.
-Summarize your key findings concisely (1-2 sentences).
-Output *only* the summary.
-""",
-    description="Researches renewable energy sources.",
-    tools=[google_search],
-    # Store result in state for the merger agent
-    output_key="renewable_energy_result"
-)
-
-# Researcher 2: Electric Vehicles
-researcher_agent_2 = LlmAgent(
-    name="EVResearcher",
-    model=GEMINI_MODEL,
-    instruction="""You are an AI Research Assistant specializing in transportation.
-Research the latest developments in 'electric vehicle technology'.
-Use the Google Search tool provided.
-Summarize your key findings concisely (1-2 sentences).
-Output *only* the summary.
-""",
-    description="Researches electric vehicle technology.",
-    tools=[google_search],
-    # Store result in state for the merger agent
-    output_key="ev_technology_result"
-)
-
-# Researcher 3: Carbon Capture
-researcher_agent_3 = LlmAgent(
-    name="CarbonCaptureResearcher",
-    model=GEMINI_MODEL,
-    instruction="""You are an AI Research Assistant specializing in climate solutions.
-Research the current state of 'carbon capture methods'.
+# --- 1. Research Topics ---
+# Each topic becomes one researcher. Only 'topic' is required; the rest is derived when missing.
+DEFAULT_TOPICS = [
+    {"topic": "renewable energy sources", "specialty": "energy", "heading": "Renewable Energy",
+     "name": "RenewableEnergyResearcher", "output_key": "renewable_energy_result"},
+    {"topic": "electric vehicle technology", "specialty": "transportation", "heading": "Electric Vehicles",
+     "name": "EVResearcher", "output_key": "ev_technology_result"},
+    {"topic": "carbon capture methods", "specialty": "climate solutions", "heading": "Carbon Capture",
+     "name": "CarbonCaptureResearcher", "output_key": "carbon_capture_result"},
+]
+
+# Researchers running at once; larger fan-outs run in waves of this size.
+MAX_CONCURRENT_RESEARCHERS = int(os.getenv("RESEARCH_MAX_CONCURRENCY", "10"))
+
+def _clean(text: str) -> str:
+    # Braces would be read as state placeholders in agent instructions.
+    return text.replace("{", "(").replace("}", ")")
+
+def _normalize_topic(index: int, topic) -> dict:
+    spec = {"topic": topic} if isinstance(topic, str) else dict(topic)
+    spec["topic"] = _clean(spec["topic"])
+    slug = re.sub(r"[^0-9a-zA-Z]+", "_", spec["topic"]).strip("_").lower()[:40] or "topic"
+    spec.setdefault("specialty", "research")
+    spec.setdefault("heading", spec["topic"].title())
+    spec.setdefault("name", f"Researcher_{index}_{slug}")
+    spec.setdefault("output_key", f"topic_{index}_{slug}_result")
+    return spec
+
+# --- 2. Researcher Factory ---
+def create_researcher(spec: dict, model=GEMINI_MODEL, tools=None) -> LlmAgent:
+    """One research sub-agent that stores its summary in state under spec['output_key']."""
+    return LlmAgent(
+        name=spec["name"],
+        model=model,
+        instruction=f"""You are an AI Research Assistant specializing in {spec['specialty']}.
+Research the latest developments in '{spec['topic']}'.
 Use the Google Search tool provided.
 Summarize your key findings concisely (1-2 sentences).
 Output *only* the summary.
 """,
-    description="Researches carbon capture methods.",
-    tools=[google_search],
-    # Store result in state for the merger agent
-    output_key="carbon_capture_result"
-)
-
-# --- 2. Create the ParallelAgent (Runs researchers concurrently) ---
-# This agent orchestrates the concurrent execution of the researchers.
-# It finishes once all researchers have completed and stored their results in state.
-parallel_research_agent = ParallelAgent(
-    name="ParallelWebResearchAgent",
-    sub_agents=[researcher_agent_1, researcher_agent_2, researcher_agent_3],
-    description="Runs multiple research agents in parallel to gather information."
-)
-
-# --- 3. Define the Merger Agent (Runs *after* the parallel agents) ---
-# This agent takes the results stored in the session state by the parallel agents
-# and synthesizes them into a single, structured response with attributions.
-merger_agent = LlmAgent(
-    name="SynthesisAgent",
-    model=GEMINI_MODEL,  # Or potentially a more powerful model if needed for synthesis
-    instruction="""You are an AI Assistant responsible for combining research findings into a structured report.
+        description=f"Researches {spec['topic']}.",
+        tools=[google_search] if tools is None else tools,
+        # Store result in state for the merger agent
+        output_key=spec["output_key"],
+    )
+
+# --- 3. Merger Factory ---
+# The merger instruction is generated from the researchers' output_keys, so it
+# has exactly one {placeholder} and one section per topic.
+def merger_instruction(specs: list) -> str:
+    summaries = "\n".join(f"*   **{s['heading']}:**\n{{{s['output_key']}}}" for s in specs)
+    sections = "\n\n".join(
+        f"### {s['heading']} Findings\n(Based on {s['name']}'s findings)\n"
+        f"[Synthesize and elaborate *only* on the {s['heading']} input summary provided above.]"
+        for s in specs
+    )
+    return f"""You are an AI Assistant responsible for combining research findings into a structured report.
 Your primary task is to synthesize the following research summaries, clearly attributing findings to their source areas.
 Structure your response using headings for each topic. Ensure the report is coherent and integrates the key points smoothly.
 
 **Crucially: Your entire response MUST be grounded *exclusively* on the information provided in the 'Input Summaries' below. Do NOT add any external knowledge, facts, or details not present in these specific summaries.**
 
 **Input Summaries:**
-*   **Renewable Energy:**
-{renewable_energy_result}
-*   **Electric Vehicles:**
-{ev_technology_result}
-*   **Carbon Capture:**
-{carbon_capture_result}
+{summaries}
 
 **Output Format:**
-## Summary of Recent Sustainable Technology Advancements
-
-### Renewable Energy Findings
-(Based on RenewableEnergyResearcher's findings)
-[Synthesize and elaborate *only* on the renewable energy input summary provided above.]
+## Summary of Research Findings
 
-### Electric Vehicle Findings
-(Based on EVResearcher's findings)
-[Synthesize and elaborate *only* on the EV input summary provided above.]
-
-### Carbon Capture Findings
-(Based on CarbonCaptureResearcher's findings)
-[Synthesize and elaborate *only* on the carbon capture input summary provided above.]
+{sections}
 
 ### Overall Conclusion
 [Provide a brief (1-2 sentence) concluding statement that connects *only* the findings presented above.]
 
 Output *only* the structured report following this format. Do not include introductory or concluding phrases outside this structure, and strictly adhere to using only the provided input summary content.
-""",
-    description="Combines research findings from parallel agents into a structured, cited report, strictly grounded on provided inputs.",
-    # No tools needed for merging
-    # No output_key needed here, as its direct response is the final output of the sequence
-)
-
-# --- 4. Create the SequentialAgent (Orchestrates the overall flow) ---
-# This is the main agent that will be run. It first executes the ParallelAgent
-# to populate the state, and then executes the MergerAgent to produce the final output.
-sequential_pipeline_agent = SequentialAgent(
-    name="ResearchAndSynthesisPipeline",
-    # Run parallel research first, then merge
-    sub_agents=[parallel_research_agent, merger_agent],
-    description="Coordinates parallel research and synthesizes the results."
-)
-
-root_agent = sequential_pipeline_agent
-
-# --- 5. Run Function ---
-async def run_research_pipeline():
+"""
+
+def create_merger(specs: list, model=GEMINI_MODEL, name: str = "SynthesisAgent") -> LlmAgent:
+    return LlmAgent(
+        name=name,
+        model=model,  # Or potentially a more powerful model if needed for synthesis
+        instruction=merger_instruction(specs),
+        description="Combines research findings from parallel agents into a structured, cited report, strictly grounded on provided inputs.",
+        # No tools needed for merging
+        # No output_key needed here, as its direct response is the final output of the sequence
+    )
+
+# --- 4. Pipeline Factory ---
+def build_research_pipeline(topics=None, max_concurrency: int = None, model=GEMINI_MODEL,
+                            merger_model=None, tools=None) -> SequentialAgent:
+    """
+    Build a research pipeline over any number of topics.
+    Args:
+        topics: Topic strings or dicts (see DEFAULT_TOPICS); defaults to DEFAULT_TOPICS.
+        max_concurrency: Researchers running at once. Topics beyond it run in
+            consecutive waves of ParallelAgents, so a 50-topic fan-out never has
+            more than this many model calls in flight.
+        model: Model (name or BaseLlm) for the researchers.
+        merger_model: Model for the merger; defaults to `model`.
+        tools: Researcher tools; defaults to [google_search].
+    Returns:
+        SequentialAgent(waves..., merger). The merger is always the last sub-agent.
+    """
+    specs = [_normalize_topic(i, t) for i, t in enumerate(topics or DEFAULT_TOPICS, 1)]
+    cap = max(1, max_concurrency or MAX_CONCURRENT_RESEARCHERS)
+    researchers = [create_researcher(spec, model, tools) for spec in specs]
+    waves = [
+        ParallelAgent(
+            name=f"ParallelWebResearchAgent_{n}" if len(researchers) > cap else "ParallelWebResearchAgent",
+            sub_agents=researchers[i:i + cap],
+            description="Runs multiple research agents in parallel to gather information.",
+        )
+        for n, i in enumerate(range(0, len(researchers), cap), 1)
+    ]
+    return SequentialAgent(
+        name="ResearchAndSynthesisPipeline",
+        # Run parallel research first (wave by wave), then merge
+        sub_agents=[*waves, create_merger(specs, merger_model or model)],
+        description="Coordinates parallel research and synthesizes the results.",
+    )
+
+def pipeline_output_keys(pipeline) -> dict:
+    """output_key -> agent name for every researcher in the pipeline."""
+    keys, stack = {}, list(pipeline.sub_agents)
+    while stack:
+        agent = stack.pop(0)
+        if getattr(agent, "output_key", None):
+            keys[agent.output_key] = agent.name
+        stack.extend(agent.sub_agents)
+    return keys
+
+# --- 5. Tree-Merge Pipeline Factory ---
+# With many topics a single merger gets every summary in one prompt and becomes
+# the latency and token bottleneck. The tree variant merges in groups of k:
+# each group is SequentialAgent(ParallelAgent(k researchers), group merger), so a
+# group's merge starts as soon as its own researchers finish, while other groups
+# are still researching. Group merges are then merged k at a time, level by
+# level, and a final merger writes the report from the top-level merges.
+def intermediate_merger_instruction(specs: list) -> str:
+    summaries = "\n".join(f"*   **{s['heading']}:**\n{{{s['output_key']}}}" for s in specs)
+    return f"""You are an AI Assistant condensing research findings for a later synthesis step.
+Combine the following summaries into one concise synthesis (1-3 sentences per topic).
+Keep every finding attributed to its topic heading, and keep numbers and names exactly as given.
+
+**Crucially: Use *only* the information in the 'Input Summaries' below. Do NOT add external knowledge.**
+
+**Input Summaries:**
+{summaries}
+
+Output *only* the synthesis, with one short paragraph per topic starting with its heading in bold.
+"""
+
+def create_intermediate_merger(specs: list, name: str, output_key: str, model=GEMINI_MODEL) -> LlmAgent:
+    return LlmAgent(
+        name=name,
+        model=model,
+        instruction=intermediate_merger_instruction(specs),
+        description="Merges a group of research results into an intermediate synthesis.",
+        output_key=output_key,
+    )
+
+def _merged_spec(specs: list, name: str, output_key: str) -> dict:
+    """Describes a merger's output the way a topic spec describes a researcher's."""
+    return {"heading": "; ".join(s["heading"] for s in specs), "name": name, "output_key": output_key}
+
+def build_tree_research_pipeline(topics=None, group_size: int = 5, max_concurrency: int = None,
+                                 model=GEMINI_MODEL, merger_model=None, tools=None) -> SequentialAgent:
+    """
+    Build a research pipeline that merges results as a k-ary tree.
+    Args:
+        topics: Topic strings or dicts (see DEFAULT_TOPICS); defaults to DEFAULT_TOPICS.
+        group_size: k, the number of inputs per merge.
+        max_concurrency: Researchers running at once. Groups run on
+            max_concurrency // group_size parallel lanes (at least one), each
+            lane working through its groups in order; a group larger than
+            max_concurrency researches in waves of max_concurrency topics.
+            Higher merge levels are capped too: their mergers run in waves
+            of at most max_concurrency.
+        model: Model (name or BaseLlm) for the researchers.
+        merger_model: Model for all mergers; defaults to `model`.
+        tools: Researcher tools; defaults to [google_search].
+    Returns:
+        SequentialAgent(parallel groups, merge levels..., final merger).
+    """
+    specs = [_normalize_topic(i, t) for i, t in enumerate(topics or DEFAULT_TOPICS, 1)]
+    k = max(2, group_size)
+    cap = max(1, max_concurrency or MAX_CONCURRENT_RESEARCHERS)
+    merger_model = merger_model or model
+
+    # Level 1: each group researches in parallel, then merges its own results.
+    groups, level_specs = [], []
+    for n, i in enumerate(range(0, len(specs), k), 1):
+        group = specs[i:i + k]
+        name, key = f"GroupMerger_1_{n}", f"merge_1_{n}_result"
+        # A group larger than the cap researches in waves of at most `cap` topics.
+        waves = [
+            ParallelAgent(
+                name=f"ParallelResearchGroup_{n}" if len(group) <= cap else f"ParallelResearchGroup_{n}_{w}",
+                sub_agents=[create_researcher(spec, model, tools) for spec in group[j:j + cap]],
+                description="Runs one group of research agents in parallel.",
+            )
+            for w, j in enumerate(range(0, len(group), cap), 1)
+        ]
+        groups.append(SequentialAgent(
+            name=f"ResearchGroup_{n}",
+            sub_agents=[*waves, create_intermediate_merger(group, name, key, merger_model)],
+            description="Researches one group of topics and merges the group's findings.",
+        ))
+        level_specs.append(_merged_spec(group, name, key))
+
+    # Concurrency cap: groups are dealt round-robin onto cap // k lanes. Lanes run
+    # in parallel and each runs its groups one after another, so at most `cap`
+    # researchers are in flight and one lane's merge overlaps other lanes' research.
+    n_lanes = min(len(groups), max(1, cap // k))
+    if n_lanes == len(groups):
+        lanes = groups
+    else:
+        lanes = [
+            SequentialAgent(
+                name=f"ResearchLane_{n}",
+                sub_agents=groups[n - 1::n_lanes],
+                description="Runs its research groups one after another.",
+            )
+            for n in range(1, n_lanes + 1)
+        ]
+    stages = [ParallelAgent(
+        name="ParallelResearchGroups",
+        sub_agents=lanes,
+        description="Runs research groups in parallel; each merges as soon as it finishes.",
+    )]
+
+    # Higher levels: merge the merges k at a time until at most k remain.
+    level = 1
+    while len(level_specs) > k:
+        level += 1
+        mergers, next_specs = [], []
+        for n, i in enumerate(range(0, len(level_specs), k), 1):
+            group = level_specs[i:i + k]
+            name, key = f"GroupMerger_{level}_{n}", f"merge_{level}_{n}_result"
+            mergers.append(create_intermediate_merger(group, name, key, merger_model))
+            next_specs.append(_merged_spec(group, name, key))
+        # Like the research, a level with more mergers than the cap merges in waves.
+        waves = [
+            ParallelAgent(
+                name=f"MergeLevel_{level}" if len(mergers) <= cap else f"MergeLevel_{level}_{w}",
+                sub_agents=mergers[j:j + cap],
+                description="Merges intermediate syntheses in parallel.",
+            )
+            for w, j in enumerate(range(0, len(mergers), cap), 1)
+        ]
+        if len(waves) == 1:
+            stages.append(waves[0])
+        else:
+            stages.append(SequentialAgent(
+                name=f"MergeLevel_{level}",
+                sub_agents=waves,
+                description="Runs one merge level in waves of at most max_concurrency mergers.",
+            ))
+        level_specs = next_specs
+
+    return SequentialAgent(
+        name="TreeResearchAndSynthesisPipeline",
+        sub_agents=[*stages, create_merger(level_specs, merger_model)],
+        description="Coordinates grouped parallel research, tree-merges the results and writes the report.",
+    )
+
+root_agent = build_research_pipeline(DEFAULT_TOPICS)
+parallel_research_agent = root_agent.sub_agents[0]
+merger_agent = root_agent.sub_agents[-1]
+
+# --- 6. Streaming Event Consumer ---
+# Researcher results are surfaced from each event's state_delta as soon as they
+# land, instead of materializing every event of the run before reading any.
+def _event_text(event) -> str:
+    if not event.content or not event.content.parts:
+        return ""
+    return "".join(part.text for part in event.content.parts if part.text)
+
+async def stream_pipeline(runner, user_id: str, session_id: str, message: str,
+                          output_keys: dict, final_author: str, on_result=None) -> dict:
+    """
+    Consume `runner.run_async` as a stream.
+    Args:
+        runner: The ADK runner.
+        user_id: Session owner.
+        session_id: Existing session to run in.
+        message: The user message that starts the pipeline.
+        output_keys: Researcher output_key -> agent name; each is reported once, as it lands.
+        final_author: Name of the agent whose final response ends the run (the merger).
+        on_result: Optional callback(output_key, value, elapsed_seconds) per researcher result.
+    Returns:
+        {'report', 'results' (by output_key), 'completed_at' (seconds by agent name), 'seconds'}
+    """
+    start = time.perf_counter()
+    results, completed_at, report = {}, {}, None
+    events = runner.run_async(
+        user_id=user_id,
+        session_id=session_id,
+        new_message=types.Content(role='user', parts=[types.Part(text=message)]),
+    )
+    try:
+        async for event in events:
+            elapsed = time.perf_counter() - start
+            for key, value in (event.actions.state_delta or {}).items():
+                if key in output_keys and key not in results:
+                    results[key] = value
+                    if on_result:
+                        on_result(key, value, elapsed)
+            if event.is_final_response():
+                completed_at.setdefault(event.author, round(elapsed, 3))
+                if event.author == final_author:
+                    report = _event_text(event)
+                    break  # Nothing after the merger's final response is needed.
+    finally:
+        await events.aclose()
+    return {
+        'report': report,
+        'results': results,
+        'completed_at': completed_at,
+        'seconds': round(time.perf_counter() - start, 3),
+    }
+
+# --- 7. Run Function ---
+async def run_research_pipeline(pipeline=None, session_service=None, user_id: str = "researcher_123"):
     print("--- Google ADK Parallel Research Pipeline ---")
-    runner = InMemoryRunner(root_agent, app_name="agents")
+    pipeline = pipeline or root_agent
+    # Sessions persist in SQLite (ADK_SESSION_DB). Each run gets a fresh one: the
+    # pipeline is one-shot, and an earlier run's events would only grow every prompt.
+    owns_service = session_service is None
+    if owns_service:
+        session_service = BatchedSqliteSessionService(os.getenv("ADK_SESSION_DB", DEFAULT_DB_PATH))
+    runner = Runner(agent=pipeline, app_name="agents", session_service=session_service)
+    output_keys = pipeline_output_keys(pipeline)
+    
+    def print_result(key: str, value: str, elapsed: float):
+        print(f"\n✅ [{elapsed:.2f}s] {output_keys.get(key, key)} ({key}):")
+        print(value)
     
     try:
-        user_id = "researcher_123"
-        session_id = str(uuid.uuid4())
-        
-        # Create session first
-        await runner.session_service.create_session(
-            app_name="agents", user_id=user_id, session_id=session_id
-        )
+        session = await session_service.create_session(app_name="agents", user_id=user_id)
         
         print("\n🔍 Starting parallel research...")
         
-        # Use synchronous run method
-        events = list(runner.run(
-            user_id=user_id,
-            session_id=session_id,
-            new_message=types.Content(
-                role='user',
-                parts=[types.Part(text="Start the research pipeline")]
-            ),
-        ))
+        outcome = await stream_pipeline(
+            runner, user_id, session.id, "Start the research pipeline",
+            output_keys=output_keys, final_author=pipeline.sub_agents[-1].name, on_result=print_result,
+        )
         
-        # Process final event
-        for event in events:
-            if event.is_final_response() and event.content:
-                if hasattr(event.content, 'text') and event.content.text:
-                    final_result = event.content.text
-                elif event.content.parts:
-                    text_parts = [part.text for part in event.content.parts if part.text]
-                    final_result = "".join(text_parts)
-                
-                print("\n📊 Final Research Report:")
-                print("=" * 50)
-                print(final_result)
-                return
+        print("\n📊 Final Research Report:")
+        print("=" * 50)
+        print(outcome['report'])
+        
+        print("\n⏱️ Completion times:")
+        for agent_name, seconds in outcome['completed_at'].items():
+            print(f"  {agent_name}: {seconds:.2f}s")
+        return outcome
                 
     except Exception as e:
         print(f"❌ Error: {e}")
         raise
+    finally:
+        await runner.close()
+        if owns_service:
+            session_service.close()
 
 if __name__ == "__main__":
     import warnings
@@ -178,8 +386,19 @@ if __name__ == "__main__":
     # Suppress warnings
     warnings.filterwarnings("ignore", category=RuntimeWarning)
     
+    # Optional runtime topics, e.g. RESEARCH_TOPICS="solid-state batteries;green hydrogen;small modular reactors"
+    topics = [t.strip() for t in os.getenv("RESEARCH_TOPICS", "").split(";") if t.strip()]
+    
+    # RESEARCH_MERGE=tree merges results in groups of RESEARCH_MERGE_GROUP_SIZE
+    tree_merge = os.getenv("RESEARCH_MERGE", "flat") == "tree"
+    group_size = int(os.getenv("RESEARCH_MERGE_GROUP_SIZE", "5"))
+    
     try:
-        asyncio.run(run_research_pipeline())
+        if tree_merge:
+            pipeline = build_tree_research_pipeline(topics or None, group_size=group_size)
+        else:
+            pipeline = build_research_pipeline(topics) if topics else None
+        asyncio.run(run_research_pipeline(pipeline))
         print("\n✅ Research pipeline completed successfully!")
     except KeyboardInterrupt:
         print("\n👋 Goodbye!")
@@ -0,0 +1,318 @@
+"""
+SQLite-backed ADK session service with batched writes and TTL eviction.
+
+`BatchedSqliteSessionService` is a drop-in `session_service` for `Runner`:
+sessions, events and app/user state live in one SQLite file, so conversations
+survive restarts and the process holds no sessions in memory between requests.
+
+- WAL journal with synchronous=NORMAL: readers never block the writer and a
+  commit does not wait for a full fsync.
+- Batched appends: events are buffered and written in one transaction when the
+  batch is full, after `flush_interval` seconds, or before any read. This only
+  pays off for wide fan-outs: with stub models a 30-topic research pipeline
+  wrote 32 events in 6 commits (session creation included), but a 2-topic run
+  still took 4 commits for 4 events: events further apart than
+  `flush_interval` are written one batch each.
+  Events still buffered when the process dies are lost (at most
+  `flush_interval` seconds' worth); call `flush()` / `close()` on shutdown.
+- Bounded history: only the newest `max_events_per_session` events are kept
+  (and loaded) per session.
+- TTL eviction: sessions idle longer than `ttl_seconds` are deleted with their
+  events, at startup and every `evict_interval` seconds.
+
+`get_or_create_user_session` reuses a user's most recent session instead of
+creating a new one per request.
+"""
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Dict, List, Optional, Tuple
+
+from google.adk.errors.already_exists_error import AlreadyExistsError
+from google.adk.events import Event
+from google.adk.sessions import BaseSessionService, Session
+from google.adk.sessions.base_session_service import GetSessionConfig, ListSessionsResponse
+from google.adk.sessions.state import State
+
+DEFAULT_DB_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "adk_sessions.db")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    app_name TEXT NOT NULL, user_id TEXT NOT NULL, id TEXT NOT NULL,
+    state TEXT NOT NULL, last_update_time REAL NOT NULL,
+    PRIMARY KEY (app_name, user_id, id));
+CREATE INDEX IF NOT EXISTS sessions_by_update ON sessions (last_update_time);
+CREATE TABLE IF NOT EXISTS events (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    app_name TEXT NOT NULL, user_id TEXT NOT NULL, session_id TEXT NOT NULL,
+    timestamp REAL NOT NULL, data TEXT NOT NULL);
+CREATE INDEX IF NOT EXISTS events_by_session ON events (app_name, user_id, session_id, seq);
+CREATE TABLE IF NOT EXISTS app_states (app_name TEXT PRIMARY KEY, state TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS user_states (
+    app_name TEXT NOT NULL, user_id TEXT NOT NULL, state TEXT NOT NULL,
+    PRIMARY KEY (app_name, user_id));
+"""
+
+
+def _split_state(state: Dict[str, Any]) -> Tuple[Dict, Dict, Dict]:
+    """Split a state (delta) into app, user and session parts; temp keys are dropped."""
+    app, user, session = {}, {}, {}
+    for key, value in (state or {}).items():
+        if key.startswith(State.APP_PREFIX):
+            app[key[len(State.APP_PREFIX):]] = value
+        elif key.startswith(State.USER_PREFIX):
+            user[key[len(State.USER_PREFIX):]] = value
+        elif not key.startswith(State.TEMP_PREFIX):
+            session[key] = value
+    return app, user, session
+
+
+class BatchedSqliteSessionService(BaseSessionService):
+    """
+    Persistent ADK session service on a single SQLite file.
+    Args:
+        db_path: SQLite file (created if missing).
+        ttl_seconds: Sessions idle longer than this are evicted.
+        max_events_per_session: Newest events kept and loaded per session.
+        batch_size: Buffered events that trigger an immediate write.
+        flush_interval: Longest time in seconds an event stays buffered.
+        evict_interval: Seconds between TTL eviction passes.
+    """
+
+    def __init__(self, db_path: str = DEFAULT_DB_PATH, ttl_seconds: float = 7 * 24 * 3600,
+                 max_events_per_session: int = 200, batch_size: int = 64,
+                 flush_interval: float = 0.05, evict_interval: float = 600):
+        self.db_path = db_path
+        self.ttl_seconds = ttl_seconds
+        self.max_events_per_session = max_events_per_session
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.evict_interval = evict_interval
+
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(db_path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(_SCHEMA)
+        self._pending: List[Tuple[Session, Event]] = []
+        self._flush_timer: Optional[asyncio.TimerHandle] = None
+        self._last_eviction = 0.0
+
+        self.events_written = 0
+        self.commits = 0
+        self.evicted = 0
+        self.evict_expired()
+
+    # --- State helpers ---
+    def _load_json(self, sql: str, params: tuple) -> Dict[str, Any]:
+        row = self._db.execute(sql, params).fetchone()
+        return json.loads(row[0]) if row else {}
+
+    def _update_scoped_state(self, app_name: str, user_id: str, app: Dict, user: Dict) -> None:
+        if app:
+            merged = self._load_json("SELECT state FROM app_states WHERE app_name = ?", (app_name,))
+            merged.update(app)
+            self._db.execute("INSERT OR REPLACE INTO app_states VALUES (?, ?)", (app_name, json.dumps(merged)))
+        if user:
+            merged = self._load_json("SELECT state FROM user_states WHERE app_name = ? AND user_id = ?",
+                                     (app_name, user_id))
+            merged.update(user)
+            self._db.execute("INSERT OR REPLACE INTO user_states VALUES (?, ?, ?)",
+                             (app_name, user_id, json.dumps(merged)))
+
+    def _merged_state(self, app_name: str, user_id: str, session_state: Dict[str, Any]) -> Dict[str, Any]:
+        """Session state plus app/user state under their prefixes, as ADK expects."""
+        state = dict(session_state)
+        app = self._load_json("SELECT state FROM app_states WHERE app_name = ?", (app_name,))
+        user = self._load_json("SELECT state FROM user_states WHERE app_name = ? AND user_id = ?",
+                               (app_name, user_id))
+        state.update({State.APP_PREFIX + k: v for k, v in app.items()})
+        state.update({State.USER_PREFIX + k: v for k, v in user.items()})
+        return state
+
+    # --- Sessions ---
+    async def create_session(self, *, app_name: str, user_id: str,
+                             state: Optional[Dict[str, Any]] = None,
+                             session_id: Optional[str] = None) -> Session:
+        session_id = (session_id or "").strip() or str(uuid.uuid4())
+        app, user, session_state = _split_state(state or {})
+        now = time.time()
+        with self._lock:
+            try:
+                with self._db:
+                    self._db.execute("INSERT INTO sessions VALUES (?, ?, ?, ?, ?)",
+                                     (app_name, user_id, session_id, json.dumps(session_state), now))
+                    self._update_scoped_state(app_name, user_id, app, user)
+            except sqlite3.IntegrityError:
+                raise AlreadyExistsError(f"Session with id {session_id} already exists.")
+            self.commits += 1
+            merged = self._merged_state(app_name, user_id, session_state)
+        self._maybe_evict()
+        return Session(id=session_id, app_name=app_name, user_id=user_id, state=merged, last_update_time=now)
+
+    async def get_session(self, *, app_name: str, user_id: str, session_id: str,
+                          config: Optional[GetSessionConfig] = None) -> Optional[Session]:
+        self.flush_pending()
+        limit = self.max_events_per_session
+        if config and config.num_recent_events is not None:
+            limit = min(limit, config.num_recent_events)
+        after = config.after_timestamp if config and config.after_timestamp is not None else float("-inf")
+        with self._lock:
+            row = self._db.execute(
+                "SELECT state, last_update_time FROM sessions WHERE app_name = ? AND user_id = ? AND id = ?",
+                (app_name, user_id, session_id),
+            ).fetchone()
+            if row is None or row[1] < time.time() - self.ttl_seconds:
+                return None
+            rows = self._db.execute(
+                "SELECT data FROM events WHERE app_name = ? AND user_id = ? AND session_id = ? AND timestamp >= ? "
+                "ORDER BY seq DESC LIMIT ?",
+                (app_name, user_id, session_id, after, limit),
+            ).fetchall() if limit > 0 else []
+            state = self._merged_state(app_name, user_id, json.loads(row[0]))
+        events = [Event.model_validate_json(data) for (data,) in reversed(rows)]
+        return Session(id=session_id, app_name=app_name, user_id=user_id, state=state,
+                       events=events, last_update_time=row[1])
+
+    async def list_sessions(self, *, app_name: str, user_id: Optional[str] = None) -> ListSessionsResponse:
+        self.flush_pending()
+        sql = "SELECT user_id, id, state, last_update_time FROM sessions WHERE app_name = ? AND last_update_time >= ?"
+        params: tuple = (app_name, time.time() - self.ttl_seconds)
+        if user_id is not None:
+            sql += " AND user_id = ?"
+            params += (user_id,)
+        with self._lock:
+            rows = self._db.execute(sql + " ORDER BY last_update_time, user_id, id", params).fetchall()
+            sessions = [
+                Session(id=sid, app_name=app_name, user_id=uid, last_update_time=updated,
+                        state=self._merged_state(app_name, uid, json.loads(state)))
+                for uid, sid, state, updated in rows
+            ]
+        return ListSessionsResponse(sessions=sessions)
+
+    async def delete_session(self, *, app_name: str, user_id: str, session_id: str) -> None:
+        self.flush_pending()
+        with self._lock, self._db:
+            self._db.execute("DELETE FROM events WHERE app_name = ? AND user_id = ? AND session_id = ?",
+                             (app_name, user_id, session_id))
+            self._db.execute("DELETE FROM sessions WHERE app_name = ? AND user_id = ? AND id = ?",
+                             (app_name, user_id, session_id))
+
+    async def get_user_state(self, *, app_name: str, user_id: str) -> Dict[str, Any]:
+        self.flush_pending()
+        with self._lock:
+            return self._load_json("SELECT state FROM user_states WHERE app_name = ? AND user_id = ?",
+                                   (app_name, user_id))
+
+    # --- Events ---
+    async def append_event(self, session: Session, event: Event) -> Event:
+        if event.partial:
+            return event
+        # Applies the delta to the in-memory session and strips temp: keys from the event.
+        event = await super().append_event(session=session, event=event)
+        session.last_update_time = event.timestamp
+        self._pending.append((session, event))
+        if len(self._pending) >= self.batch_size:
+            self.flush_pending()
+        elif self._flush_timer is None:
+            self._flush_timer = asyncio.get_running_loop().call_later(self.flush_interval, self.flush_pending)
+        return event
+
+    async def flush(self) -> None:
+        self.flush_pending()
+
+    def flush_pending(self) -> None:
+        """Write every buffered event and its state changes in one transaction."""
+        if self._flush_timer is not None:
+            self._flush_timer.cancel()
+            self._flush_timer = None
+        if not self._pending:
+            return
+        batch, self._pending = self._pending, []
+
+        rows, changes = [], {}
+        for session, event in batch:
+            key = (session.app_name, session.user_id, session.id)
+            rows.append((*key, event.timestamp, event.model_dump_json(exclude_none=True)))
+            app, user, session_delta = _split_state(event.actions.state_delta if event.actions else None)
+            change = changes.setdefault(key, {"app": {}, "user": {}, "session": {}, "updated": 0.0})
+            change["app"].update(app)
+            change["user"].update(user)
+            change["session"].update(session_delta)
+            change["updated"] = max(change["updated"], event.timestamp)
+
+        with self._lock:
+            with self._db:
+                self._db.executemany(
+                    "INSERT INTO events (app_name, user_id, session_id, timestamp, data) VALUES (?, ?, ?, ?, ?)", rows
+                )
+                for key, change in changes.items():
+                    state = self._load_json(
+                        "SELECT state FROM sessions WHERE app_name = ? AND user_id = ? AND id = ?", key
+                    )
+                    state.update(change["session"])
+                    updated = self._db.execute(
+                        "UPDATE sessions SET state = ?, last_update_time = ? WHERE app_name = ? AND user_id = ? AND id = ?",
+                        (json.dumps(state), change["updated"], *key),
+                    ).rowcount
+                    if not updated:
+                        # The session was deleted or evicted meanwhile; drop its orphaned events.
+                        self._db.execute("DELETE FROM events WHERE app_name = ? AND user_id = ? AND session_id = ?", key)
+                        continue
+                    self._update_scoped_state(key[0], key[1], change["app"], change["user"])
+                    # Keep only the newest events of this session.
+                    self._db.execute(
+                        "DELETE FROM events WHERE app_name = ? AND user_id = ? AND session_id = ? AND seq <= ("
+                        "SELECT seq FROM events WHERE app_name = ? AND user_id = ? AND session_id = ? "
+                        "ORDER BY seq DESC LIMIT 1 OFFSET ?)",
+                        (*key, *key, self.max_events_per_session),
+                    )
+            self.events_written += len(rows)
+            self.commits += 1
+        self._maybe_evict()
+
+    # --- Eviction ---
+    def _maybe_evict(self) -> None:
+        if time.time() - self._last_eviction >= self.evict_interval:
+            self.evict_expired()
+
+    def evict_expired(self) -> int:
+        """Delete sessions idle longer than the TTL, with their events. Returns the number evicted."""
+        cutoff = time.time() - self.ttl_seconds
+        with self._lock, self._db:
+            self._db.execute(
+                "DELETE FROM events WHERE EXISTS (SELECT 1 FROM sessions s WHERE s.app_name = events.app_name "
+                "AND s.user_id = events.user_id AND s.id = events.session_id AND s.last_update_time < ?)",
+                (cutoff,),
+            )
+            evicted = self._db.execute("DELETE FROM sessions WHERE last_update_time < ?", (cutoff,)).rowcount
+        self.evicted += evicted
+        self._last_eviction = time.time()
+        return evicted
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            sessions = self._db.execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+            events = self._db.execute("SELECT COUNT(*) FROM events").fetchone()[0]
+        return {"sessions": sessions, "events": events, "events_written": self.events_written,
+                "commits": self.commits, "evicted": self.evicted, "pending": len(self._pending)}
+
+    def close(self) -> None:
+        self.flush_pending()
+        with self._lock:
+            self._db.close()
+
+
+async def get_or_create_user_session(session_service: BaseSessionService, app_name: str, user_id: str) -> Session:
+    """
+    Return the user's most recently active session, creating one only if the user has none.
+    Works with any ADK session service; sessions are listed oldest first.
+    """
+    sessions = (await session_service.list_sessions(app_name=app_name, user_id=user_id)).sessions
+    if sessions:
+        return sessions[-1]
+    return await session_service.create_session(app_name=app_name, user_id=user_id)
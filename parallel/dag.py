@@ -0,0 +1,302 @@
+"""
+A small declarative DAG executor for async LLM pipelines.
+
+Each `Node` names an async function and the nodes it depends on. `DagExecutor`
+starts every node as soon as its dependencies have finished, applies per-node
+timeouts and retries, and cancels the rest of a run when a required node
+fails. Optional nodes instead resolve to a `Missing` marker when they fail or
+miss their deadline, so dependents can proceed with partial inputs. Slow
+calls can be hedged: once a call outlives the node's recent p95 latency, a
+duplicate is fired and whichever finishes first wins. One executor can run
+many DAG instances (e.g. many topics) at once; a shared semaphore caps how
+many node calls are in flight across all of them.
+"""
+import asyncio
+import time
+from collections import deque
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+
+
+class DagError(Exception):
+    """Raised when a node fails after exhausting its retries."""
+
+    def __init__(self, node: str, cause: BaseException):
+        super().__init__(f"Node '{node}' failed: {type(cause).__name__}: {cause}")
+        self.node = node
+        self.cause = cause
+
+
+class Missing:
+    """Placeholder result for an optional node that failed or missed its deadline."""
+
+    def __init__(self, node: str, reason: str):
+        self.node = node
+        self.reason = reason
+
+    def __str__(self) -> str:
+        return f"[unavailable: {self.reason}]"
+
+    def __repr__(self) -> str:
+        return f"Missing({self.node!r}, {self.reason!r})"
+
+
+class Node:
+    """
+    A single step in the DAG.
+    Args:
+        name: Unique node name; its result is passed to dependents under this keyword.
+        func: Async function called with the run context plus one keyword per dependency.
+        deps: Names of the nodes whose results this node needs.
+        timeout: Seconds allowed per attempt (None for no limit).
+        retries: Extra attempts after the first failure.
+        retry_backoff: Base delay in seconds, doubled after each failed attempt.
+        deadline: Seconds allowed for the node overall, across retries and hedges.
+        required: If False, failure or a missed deadline yields `Missing` instead of failing the run.
+        hedge: Fire a duplicate call once an attempt exceeds the node's recent p95 latency.
+        hedge_percentile: Latency percentile that triggers a hedge.
+        min_hedge_samples: Successful calls observed before hedging kicks in.
+    """
+
+    def __init__(self, name: str, func: Callable[..., Awaitable[Any]], deps: Iterable[str] = (),
+                 timeout: Optional[float] = None, retries: int = 0, retry_backoff: float = 0.5,
+                 deadline: Optional[float] = None, required: bool = True, hedge: bool = False,
+                 hedge_percentile: float = 95, min_hedge_samples: int = 20):
+        self.name = name
+        self.func = func
+        self.deps = list(deps)
+        self.timeout = timeout
+        self.retries = retries
+        self.retry_backoff = retry_backoff
+        self.deadline = deadline
+        self.required = required
+        self.hedge = hedge
+        self.hedge_percentile = hedge_percentile
+        self.min_hedge_samples = min_hedge_samples
+
+        # Shared across every run of this node, so hedging adapts to live traffic.
+        self.latencies: deque = deque(maxlen=200)
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.missed = 0
+
+    def hedge_delay(self) -> Optional[float]:
+        """Seconds to wait before hedging, or None if hedging is off or not yet calibrated."""
+        if not self.hedge or len(self.latencies) < self.min_hedge_samples:
+            return None
+        ordered = sorted(self.latencies)
+        index = min(len(ordered) - 1, int(len(ordered) * self.hedge_percentile / 100))
+        return ordered[index]
+
+
+class DagExecutor:
+    """Run a DAG of `Node`s, every ready node concurrently, under a global concurrency cap."""
+
+    def __init__(self, nodes: List[Node], max_concurrency: Optional[int] = None):
+        self.nodes = {node.name: node for node in nodes}
+        if len(self.nodes) != len(nodes):
+            raise ValueError("Node names must be unique.")
+        for node in nodes:
+            missing = [dep for dep in node.deps if dep not in self.nodes]
+            if missing:
+                raise ValueError(f"Node '{node.name}' depends on unknown node(s): {missing}")
+        self.order = self._topological_order()
+        self.max_concurrency = max_concurrency
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def _topological_order(self) -> List[str]:
+        remaining = {name: set(node.deps) for name, node in self.nodes.items()}
+        order = []
+        while remaining:
+            ready = [name for name, deps in remaining.items() if not deps]
+            if not ready:
+                raise ValueError(f"Dependency cycle among nodes: {sorted(remaining)}")
+            for name in ready:
+                order.append(name)
+                del remaining[name]
+            for deps in remaining.values():
+                deps.difference_update(ready)
+        return order
+
+    @property
+    def semaphore(self) -> Optional[asyncio.Semaphore]:
+        # Created lazily (and per event loop) so the executor can be built at import
+        # time and reused across separate asyncio.run() calls.
+        if not self.max_concurrency:
+            return None
+        loop = asyncio.get_running_loop()
+        if self._semaphore is None or self._loop is not loop:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._loop = loop
+        return self._semaphore
+
+    async def _attempt(self, node: Node, kwargs: Dict[str, Any]) -> Any:
+        semaphore = self.semaphore
+        if semaphore is None:
+            return await self._timed(node, kwargs)
+        async with semaphore:
+            return await self._timed(node, kwargs)
+
+    async def _timed(self, node: Node, kwargs: Dict[str, Any]) -> Any:
+        # Timed inside the semaphore so queueing for a slot doesn't inflate the p95.
+        start = time.perf_counter()
+        result = await asyncio.wait_for(node.func(**kwargs), node.timeout)
+        node.latencies.append(time.perf_counter() - start)
+        return result
+
+    async def _call(self, node: Node, kwargs: Dict[str, Any]) -> Any:
+        hedge_after = node.hedge_delay()
+        primary = asyncio.create_task(self._attempt(node, kwargs))
+        if hedge_after is None:
+            return await primary
+
+        tasks = {primary}
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=hedge_after)
+            if not done:
+                node.hedges += 1
+                hedge = asyncio.create_task(self._attempt(node, kwargs))
+                tasks.add(hedge)
+            # First successful call wins; only fail if every call failed.
+            while tasks:
+                done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is not primary:
+                            node.hedge_wins += 1
+                        return task.result()
+            return primary.result()  # Re-raises the primary's exception
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def _call_with_retries(self, node: Node, kwargs: Dict[str, Any]) -> Any:
+        for attempt in range(node.retries + 1):
+            try:
+                return await self._call(node, kwargs)
+            except Exception as e:
+                if attempt == node.retries:
+                    raise DagError(node.name, e) from e
+                await asyncio.sleep(node.retry_backoff * (2 ** attempt))
+
+    async def _run_node(self, node: Node, kwargs: Dict[str, Any]) -> Any:
+        try:
+            return await asyncio.wait_for(self._call_with_retries(node, kwargs), node.deadline)
+        except asyncio.TimeoutError as e:
+            if node.required:
+                raise DagError(node.name, e) from e
+            node.missed += 1
+            return Missing(node.name, f"missed its {node.deadline:g}s deadline")
+        except DagError as e:
+            if node.required:
+                raise
+            node.missed += 1
+            return Missing(node.name, f"{type(e.cause).__name__}: {e.cause}")
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """Per-node hedging and deadline counters, plus the current hedge delay."""
+        return {
+            name: {
+                "calls": len(node.latencies),
+                "hedge_after": node.hedge_delay(),
+                "hedges": node.hedges,
+                "hedge_wins": node.hedge_wins,
+                "missed": node.missed,
+            }
+            for name, node in self.nodes.items()
+        }
+
+    def _with_ancestors(self, targets: Iterable[str]) -> set:
+        needed = set()
+        stack = list(targets)
+        while stack:
+            name = stack.pop()
+            if name not in needed:
+                needed.add(name)
+                stack.extend(self.nodes[name].deps)
+        return needed
+
+    async def run(self, **context: Any) -> Dict[str, Any]:
+        """
+        Execute the DAG once.
+        Args:
+            **context: Keyword arguments passed to every node (e.g. topic="...").
+        Returns:
+            A dict mapping every node name to its result.
+        Raises:
+            DagError: If a required node fails; all other in-flight nodes are
+                cancelled and no downstream node is started. Optional nodes
+                resolve to `Missing` instead.
+        """
+        return await self.run_targets(self.order, **context)
+
+    async def run_targets(self, targets: Iterable[str], **context: Any) -> Dict[str, Any]:
+        """
+        Execute only `targets` and the nodes they depend on.
+        Useful when the caller wants to run the last step itself (e.g. to stream it).
+        """
+        needed = self._with_ancestors(targets)
+        results: Dict[str, Any] = {}
+        running: Dict[asyncio.Task, str] = {}
+        waiting = [name for name in self.order if name in needed]
+        try:
+            while waiting or running:
+                for name in [n for n in waiting if all(dep in results for dep in self.nodes[n].deps)]:
+                    node = self.nodes[name]
+                    kwargs = dict(context, **{dep: results[dep] for dep in node.deps})
+                    running[asyncio.create_task(self._run_node(node, kwargs))] = name
+                    waiting.remove(name)
+
+                done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    name = running.pop(task)
+                    results[name] = task.result()  # Re-raises DagError on failure
+        finally:
+            for task in running:
+                task.cancel()
+            if running:
+                await asyncio.gather(*running, return_exceptions=True)
+        return results
+
+    async def run_many(self, contexts: Iterable[Dict[str, Any]],
+                       max_in_flight: Optional[int] = None) -> AsyncIterator[Tuple[int, Dict[str, Any], Any]]:
+        """
+        Execute the DAG once per context, concurrently, yielding runs as they finish.
+        Node calls across all runs share the executor's concurrency cap.
+        Args:
+            contexts: One context dict per run; consumed lazily when `max_in_flight` is set.
+            max_in_flight: Maximum number of runs started but not finished (None for all at once).
+        Yields:
+            (index, context, results) where `results` is the dict returned by
+            `run`, or the exception if that run failed.
+        """
+        if max_in_flight is None:
+            contexts = list(contexts)
+            max_in_flight = max(1, len(contexts))
+        pending = enumerate(contexts)
+        finished: asyncio.Queue = asyncio.Queue()
+
+        async def worker() -> None:
+            try:
+                # Workers share one iterator, so each context is run exactly once.
+                for index, context in pending:
+                    try:
+                        results = await self.run(**context)
+                    except Exception as e:
+                        results = e
+                    await finished.put((index, context, results))
+            finally:
+                await finished.put(None)
+
+        workers = [asyncio.create_task(worker()) for _ in range(max_in_flight)]
+        try:
+            remaining = len(workers)
+            while remaining:
+                item = await finished.get()
+                if item is None:
+                    remaining -= 1
+                else:
+                    yield item
+        finally:
+            for task in workers:
+                task.cancel()
@@ -1,76 +1,246 @@
 import os
 import asyncio
-from typing import Dict, Any
+import time
+from typing import Dict, Any, AsyncIterator, Iterable, Optional, Tuple
 from dotenv import load_dotenv
 import google.generativeai as genai
+from dag import DagExecutor, Missing, Node
+from rate_limit import RateLimiter, estimate_tokens
+
+# Optional: import the exception raised for HTTP 429 (quota exceeded)
+try:
+    from google.api_core.exceptions import ResourceExhausted
+except Exception:
+    ResourceExhausted = None
 
 # Load environment variables
 load_dotenv()
 genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
 model = genai.GenerativeModel('gemini-2.0-flash')
 
+# --- Shared Rate Limiting ---
+# Every model call in this module goes through `generate`, which acquires from
+# one limiter so all in-flight topics together stay under the RPM/TPM quota.
+rate_limiter = RateLimiter(
+    requests_per_minute=float(os.getenv("GEMINI_RPM", "60")),
+    tokens_per_minute=float(os.getenv("GEMINI_TPM", "250000")),
+)
+EXPECTED_OUTPUT_TOKENS = 400
+MAX_RATE_LIMIT_RETRIES = 5
+
+def _is_rate_limited(error: Exception) -> bool:
+    if ResourceExhausted is not None and isinstance(error, ResourceExhausted):
+        return True
+    return "429" in str(error)
+
+async def generate(prompt: str) -> str:
+    """Call the model under the shared rate limiter, backing off on 429s."""
+    estimated = estimate_tokens(prompt) + EXPECTED_OUTPUT_TOKENS
+    for attempt in range(MAX_RATE_LIMIT_RETRIES + 1):
+        await rate_limiter.acquire(estimated)
+        try:
+            response = await model.generate_content_async(prompt)
+        except Exception as e:
+            if not _is_rate_limited(e) or attempt == MAX_RATE_LIMIT_RETRIES:
+                raise
+            rate_limiter.record_rate_limited()
+            continue
+        usage = getattr(response, "usage_metadata", None)
+        rate_limiter.record_success(estimated, getattr(usage, "total_token_count", None))
+        return response.text
+
 # --- Parallel Processing Functions ---
 async def summarize_topic(topic: str) -> str:
     """Summarize the topic concisely."""
     prompt = f"Summarize the following topic concisely: {topic}"
-    response = await model.generate_content_async(prompt)
-    return response.text
+    return await generate(prompt)
 
 async def generate_questions(topic: str) -> str:
     """Generate three interesting questions about the topic."""
     prompt = f"Generate three interesting questions about the following topic: {topic}"
-    response = await model.generate_content_async(prompt)
-    return response.text
+    return await generate(prompt)
 
 async def extract_key_terms(topic: str) -> str:
     """Identify 5-10 key terms from the topic."""
     prompt = f"Identify 5-10 key terms from the following topic, separated by commas: {topic}"
-    response = await model.generate_content_async(prompt)
-    return response.text
+    return await generate(prompt)
 
-async def synthesize_results(topic: str, summary: str, questions: str, key_terms: str) -> str:
-    """Synthesize all results into a comprehensive answer."""
-    prompt = f"""Based on the following information:
+def _synthesis_prompt(topic: str, summary: str, questions: str, key_terms: str) -> str:
+    # Branches that failed or missed their deadline arrive as `Missing` markers.
+    partial = any(isinstance(part, Missing) for part in (summary, questions, key_terms))
+    note = "\n    Some inputs are marked unavailable; work with the information that is present." if partial else ""
+    return f"""Based on the following information:
     Summary: {summary}
     Related Questions: {questions}
     Key Terms: {key_terms}
-    
+    {note}
     Synthesize a comprehensive answer about: {topic}"""
-    
-    response = await model.generate_content_async(prompt)
-    return response.text
+
+async def synthesize_results(topic: str, summary: str, questions: str, key_terms: str) -> str:
+    """Synthesize all results into a comprehensive answer."""
+    prompt = _synthesis_prompt(topic, summary, questions, key_terms)
+    return await generate(prompt)
+
+# --- Streaming Synthesis ---
+class StreamMetrics:
+    """Latency of one streamed response: time to first token vs. total."""
+
+    def __init__(self):
+        self.ttft_seconds: Optional[float] = None
+        self.total_seconds: Optional[float] = None
+        self.chunks = 0
+
+    def summary(self) -> str:
+        ttft = f"{self.ttft_seconds:.2f}s" if self.ttft_seconds is not None else "n/a"
+        total = f"{self.total_seconds:.2f}s" if self.total_seconds is not None else "n/a"
+        return f"Time to first token: {ttft}, total: {total}, {self.chunks} chunks"
+
+async def stream_synthesis(topic: str, summary: str, questions: str, key_terms: str,
+                           metrics: Optional[StreamMetrics] = None) -> AsyncIterator[str]:
+    """
+    Stream the synthesis as text chunks arrive from the model.
+    Args:
+        topic, summary, questions, key_terms: As for `synthesize_results`.
+        metrics: Optional StreamMetrics filled in with TTFT and total latency.
+    Yields:
+        Text chunks of the synthesized answer.
+    """
+    metrics = metrics if metrics is not None else StreamMetrics()
+    prompt = _synthesis_prompt(topic, summary, questions, key_terms)
+    estimated = estimate_tokens(prompt) + EXPECTED_OUTPUT_TOKENS
+
+    # Starting the stream is retried on 429s like `generate`; time to first
+    # token includes any backoff, since the caller waits through it.
+    start = time.perf_counter()
+    for attempt in range(MAX_RATE_LIMIT_RETRIES + 1):
+        await rate_limiter.acquire(estimated)
+        try:
+            response = await model.generate_content_async(prompt, stream=True)
+        except Exception as e:
+            if not _is_rate_limited(e) or attempt == MAX_RATE_LIMIT_RETRIES:
+                raise
+            rate_limiter.record_rate_limited()
+            continue
+        break
+    async for chunk in response:
+        text = chunk.text
+        if not text:
+            continue
+        if metrics.ttft_seconds is None:
+            metrics.ttft_seconds = time.perf_counter() - start
+        metrics.chunks += 1
+        yield text
+    metrics.total_seconds = time.perf_counter() - start
+
+    usage = getattr(response, "usage_metadata", None)
+    rate_limiter.record_success(estimated, getattr(usage, "total_token_count", None))
+
+# --- Pipeline DAG ---
+# Each node's result is passed to its dependents under the node's name, so the
+# names match the parameters of `synthesize_results`. The three branches have
+# no dependencies and run concurrently; synthesis starts once all three finish.
+# Branches are optional with a per-branch deadline: a slow or failing branch is
+# marked missing instead of holding up (or failing) the synthesis, and calls
+# slower than the branch's recent p95 are hedged with a duplicate request.
+# The concurrency cap is shared by every topic run through this executor.
+NODE_TIMEOUT = float(os.getenv("PARALLEL_NODE_TIMEOUT", "60"))
+NODE_RETRIES = int(os.getenv("PARALLEL_NODE_RETRIES", "2"))
+BRANCH_DEADLINE = float(os.getenv("PARALLEL_BRANCH_DEADLINE", "20"))
+
+def _branch(name: str, func) -> Node:
+    return Node(name, func, timeout=NODE_TIMEOUT, retries=NODE_RETRIES,
+                deadline=BRANCH_DEADLINE, required=False, hedge=True)
+
+research_dag = DagExecutor([
+    _branch("summary", summarize_topic),
+    _branch("questions", generate_questions),
+    _branch("key_terms", extract_key_terms),
+    Node("final", synthesize_results, deps=["summary", "questions", "key_terms"],
+         timeout=NODE_TIMEOUT, retries=NODE_RETRIES),
+], max_concurrency=int(os.getenv("PARALLEL_MAX_CONCURRENCY", "8")))
 
 # --- Run Parallel Processing ---
-async def run_parallel_example(topic: str) -> None:
+async def stream_parallel_example(topic: str, metrics: Optional[StreamMetrics] = None) -> AsyncIterator[str]:
+    """
+    Run the three parallel branches, then stream the synthesis token by token.
+    Args:
+        topic: The input topic to be processed.
+        metrics: Optional StreamMetrics filled in with the synthesis TTFT and total latency.
+    Yields:
+        Text chunks of the final answer, as they arrive.
+    """
+    branches = await research_dag.run_targets(["summary", "questions", "key_terms"], topic=topic)
+    async for text in stream_synthesis(topic, **branches, metrics=metrics):
+        yield text
+
+async def run_parallel_example(topic: str, stream: bool = False) -> None:
     """
     Run parallel processing tasks and synthesize results.
     Args:
         topic: The input topic to be processed.
+        stream: Print the synthesis progressively as it is generated.
     """
     print(f"\n--- Running Parallel Processing for Topic: '{topic}' ---")
     
     try:
-        print("🔄 Running parallel tasks...")
-        
-        # Run three tasks in parallel using asyncio.gather
-        summary, questions, key_terms = await asyncio.gather(
-            summarize_topic(topic),
-            generate_questions(topic),
-            extract_key_terms(topic)
-        )
-        
-        print("✅ Parallel tasks completed. Synthesizing results...")
-        
-        # Synthesize the results
-        final_result = await synthesize_results(topic, summary, questions, key_terms)
+        print("🔄 Running pipeline DAG...")
+        if stream:
+            metrics = StreamMetrics()
+            print("\n--- Final Response ---")
+            async for text in stream_parallel_example(topic, metrics):
+                print(text, end="", flush=True)
+            print(f"\n\n⏱️ {metrics.summary()}")
+            return
+
+        results = await research_dag.run(topic=topic)
         
         print("\n--- Final Response ---")
-        print(final_result)
+        print(results["final"])
         
     except Exception as e:
         print(f"\nAn error occurred: {e}")
 
+async def run_batch(topics: Iterable[str],
+                    max_topics_in_flight: Optional[int] = None) -> AsyncIterator[Tuple[str, Any]]:
+    """
+    Run the pipeline over many topics, yielding each topic as its synthesis completes.
+    All model calls share `rate_limiter`, so the batch size does not affect quota usage.
+    Args:
+        topics: The input topics; consumed lazily, so a generator of hundreds is fine.
+        max_topics_in_flight: Topics processed at once (defaults to PARALLEL_TOPICS_IN_FLIGHT).
+    Yields:
+        (topic, final_synthesis) or (topic, exception) if that topic failed.
+    """
+    if max_topics_in_flight is None:
+        max_topics_in_flight = int(os.getenv("PARALLEL_TOPICS_IN_FLIGHT", "16"))
+    contexts = ({"topic": t} for t in topics)
+    async for _, context, results in research_dag.run_many(contexts, max_in_flight=max_topics_in_flight):
+        if isinstance(results, Exception):
+            yield context["topic"], results
+        else:
+            yield context["topic"], results["final"]
+
+async def run_many_topics(topics: Iterable[str]) -> Dict[str, Any]:
+    """
+    Run the pipeline for many topics at once, printing each result as it completes.
+    Args:
+        topics: The input topics to be processed.
+    Returns:
+        A dict mapping each topic to its final synthesis, or to the exception if it failed.
+    """
+    final_results = {}
+    async for topic, result in run_batch(topics):
+        if isinstance(result, Exception):
+            print(f"\n❌ '{topic}' failed: {result}")
+        else:
+            print(f"\n✅ '{topic}' completed")
+        final_results[topic] = result
+    print(f"\n{rate_limiter.summary()}")
+    for name, stats in research_dag.stats().items():
+        print(f"Node '{name}': {stats}")
+    return final_results
+
 if __name__ == "__main__":
     test_topic = "The history of space exploration"
     # In Python 3.7+, asyncio.run is the standard way to run an async function.
-    asyncio.run(run_parallel_example(test_topic))
\ No newline at end of file
+    asyncio.run(run_parallel_example(test_topic, stream=True))
\ No newline at end of file
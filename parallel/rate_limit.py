@@ -0,0 +1,115 @@
+"""
+Shared requests-per-minute / tokens-per-minute limiter for Gemini calls.
+
+Every `generate_content_async` call acquires from one `RateLimiter` before it
+is sent, so any number of in-flight topics stay under the project's quota.
+Two token buckets (requests and tokens) refill continuously. On a 429 the
+limiter pauses all callers with exponential backoff and halves its effective
+rate; each success restores a little of it (AIMD), so throughput settles just
+below whatever the quota really is.
+"""
+import asyncio
+import time
+from typing import Optional
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token estimate (~4 characters per token for English text)."""
+    return max(1, len(text) // 4)
+
+
+class RateLimiter:
+    """
+    Token-bucket limiter on requests-per-minute and tokens-per-minute.
+    Args:
+        requests_per_minute: Request quota (RPM).
+        tokens_per_minute: Token quota (TPM), input plus output.
+        min_rate_factor: Lowest fraction of the quota adaptive backoff may drop to.
+        max_backoff: Longest pause in seconds after repeated 429s.
+    """
+
+    def __init__(self, requests_per_minute: float, tokens_per_minute: float,
+                 min_rate_factor: float = 0.1, max_backoff: float = 60.0):
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.min_rate_factor = min_rate_factor
+        self.max_backoff = max_backoff
+
+        self.rate_factor = 1.0
+        self._requests = float(requests_per_minute)
+        self._tokens = float(tokens_per_minute)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._backoff = 1.0
+        self._lock: Optional[asyncio.Lock] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+        self.rate_limited = 0
+        self.waited_seconds = 0.0
+
+    def _get_lock(self) -> asyncio.Lock:
+        # One lock per event loop so the limiter can be created at import time.
+        loop = asyncio.get_running_loop()
+        if self._lock is None or self._loop is not loop:
+            self._lock = asyncio.Lock()
+            self._loop = loop
+        return self._lock
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        elapsed = now - self._updated
+        self._updated = now
+        rpm = self.requests_per_minute * self.rate_factor
+        tpm = self.tokens_per_minute * self.rate_factor
+        self._requests = min(rpm, self._requests + elapsed * rpm / 60.0)
+        self._tokens = min(tpm, self._tokens + elapsed * tpm / 60.0)
+
+    async def acquire(self, tokens: int) -> None:
+        """Wait until one request and `tokens` tokens fit under the quota, then take them."""
+        # Never ask for more than a full bucket, or the call could wait forever.
+        tokens = min(tokens, self.tokens_per_minute * self.min_rate_factor)
+        start = time.monotonic()
+        # The lock makes waiters queue in FIFO order instead of racing for refills.
+        async with self._get_lock():
+            while True:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                    continue
+                self._refill()
+                if self._requests >= 1 and self._tokens >= tokens:
+                    self._requests -= 1
+                    self._tokens -= tokens
+                    break
+                rpm = self.requests_per_minute * self.rate_factor
+                tpm = self.tokens_per_minute * self.rate_factor
+                wait = max((1 - self._requests) * 60.0 / rpm, (tokens - self._tokens) * 60.0 / tpm, 0.01)
+                await asyncio.sleep(wait)
+        self.waited_seconds += time.monotonic() - start
+
+    def record_success(self, estimated_tokens: int, actual_tokens: Optional[int] = None) -> None:
+        """Reconcile the token estimate with actual usage and recover some rate."""
+        if actual_tokens is not None:
+            self._tokens -= actual_tokens - estimated_tokens
+        self._backoff = 1.0
+        self.rate_factor = min(1.0, self.rate_factor + 0.05)
+
+    def record_rate_limited(self) -> float:
+        """
+        Register a 429: pause every caller and halve the effective rate.
+        Returns:
+            The pause length in seconds.
+        """
+        self.rate_limited += 1
+        pause = self._backoff
+        self._paused_until = max(self._paused_until, time.monotonic() + pause)
+        self._backoff = min(self.max_backoff, self._backoff * 2)
+        self.rate_factor = max(self.min_rate_factor, self.rate_factor / 2)
+        return pause
+
+    def summary(self) -> str:
+        return (
+            f"Rate limiter: {self.rate_limited} rate-limited responses, "
+            f"{self.waited_seconds:.1f}s spent waiting for quota, "
+            f"current rate at {self.rate_factor:.0%} of quota"
+        )
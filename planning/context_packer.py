@@ -0,0 +1,164 @@
+"""
+Token-budgeted packing of search sources into the final-report prompt.
+
+`ContextPacker` ranks sources by relevance to the research queries and adds
+them best-first until the token budget is spent. Sources that do not fit are
+either dropped or, when a `summarize` function is given, condensed map-reduce
+style: overflow sources are grouped into chunks, each chunk is summarized
+(the map step, run concurrently), and the chunk summaries are summarized
+again (the reduce step) into one block that fits the share of the budget
+reserved for it. `PackedContext.report()` shows tokens sent vs. available.
+"""
+import math
+import re
+from concurrent.futures import Executor
+from typing import Callable, Dict, Iterable, List, Optional
+
+_WORD = re.compile(r"[a-z0-9]+")
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token estimate (~4 characters per token for English text)."""
+    return max(1, len(text) // 4)
+
+
+def format_source(source: Dict) -> str:
+    return f"Source: {source.get('title', '')} - {source.get('snippet', '')}"
+
+
+def rank_results(results: List[Dict], queries: Iterable[str]) -> List[Dict]:
+    """
+    Order results by relevance to the research queries: idf-weighted query-term
+    overlap with the title and snippet, plus a bonus for sources several queries found.
+    Sets `relevance` on each result.
+    """
+    query_terms = set(_WORD.findall(" ".join(queries).lower()))
+    docs = [set(_WORD.findall(f"{r.get('title', '')} {r.get('snippet', '')}".lower())) for r in results]
+    n = len(docs) or 1
+    idf = {t: math.log(1 + n / (1 + sum(t in d for d in docs))) for t in query_terms}
+    for result, terms in zip(results, docs):
+        overlap = sum(idf[t] for t in query_terms & terms)
+        result["relevance"] = round(overlap / math.sqrt(len(terms) or 1) + 0.5 * (len(result.get("queries", [])) - 1), 4)
+    return sorted(results, key=lambda r: r["relevance"], reverse=True)
+
+
+class PackedContext:
+    """The packed research context and how much of the available material it carries."""
+
+    def __init__(self, text: str, included: List[Dict], overflow: List[Dict], summary: str,
+                 tokens_sent: int, tokens_available: int, token_budget: int, summary_calls: int):
+        self.text = text
+        self.included = included
+        self.overflow = overflow
+        self.summary = summary
+        self.tokens_sent = tokens_sent
+        self.tokens_available = tokens_available
+        self.token_budget = token_budget
+        self.summary_calls = summary_calls
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "tokens_sent": self.tokens_sent,
+            "tokens_available": self.tokens_available,
+            "token_budget": self.token_budget,
+            "sources_included": len(self.included),
+            "sources_overflow": len(self.overflow),
+            "summary_calls": self.summary_calls,
+        }
+
+    def report(self) -> str:
+        share = (self.tokens_sent / self.tokens_available * 100) if self.tokens_available else 0.0
+        line = (f"Context: {self.tokens_sent} tokens sent of {self.tokens_available} available "
+                f"({share:.0f}%), budget {self.token_budget}; "
+                f"{len(self.included)} sources verbatim, {len(self.overflow)} overflow")
+        if self.overflow:
+            calls = f"{self.summary_calls} call{'s' if self.summary_calls != 1 else ''}"
+            line += f" ({'summarized in ' + calls if self.summary else 'dropped'})"
+        return line
+
+
+class ContextPacker:
+    """
+    Fill a token budget with the most relevant sources.
+    Args:
+        token_budget: Maximum tokens of research context sent to the model.
+        summarize: Optional `summarize(text, max_tokens) -> str` used to condense
+            the overflow; without it, overflow sources are dropped.
+        summary_share: Fraction of the budget reserved for the overflow summary
+            (only reserved when there is overflow to summarize).
+        chunk_tokens: Size of each chunk in the map step.
+        executor: Runs the map-step summaries concurrently when given.
+    """
+
+    def __init__(self, token_budget: int = 8000,
+                 summarize: Optional[Callable[[str, int], str]] = None,
+                 summary_share: float = 0.25, chunk_tokens: int = 4000,
+                 executor: Optional[Executor] = None):
+        self.token_budget = token_budget
+        self.summarize = summarize
+        self.summary_share = summary_share
+        self.chunk_tokens = chunk_tokens
+        self.executor = executor
+
+    def _fill(self, ranked: List[Dict], budget: int):
+        included, overflow, used = [], [], 0
+        for source in ranked:
+            cost = estimate_tokens(format_source(source)) + 1  # +1 for the newline
+            if used + cost <= budget:
+                included.append(source)
+                used += cost
+            else:
+                overflow.append(source)  # Keep going: a shorter source may still fit.
+        return included, overflow
+
+    def _summarize_overflow(self, overflow: List[Dict], max_tokens: int):
+        # Map: summarize chunks of overflow sources, each chunk within chunk_tokens.
+        chunks, current, current_tokens = [], [], 0
+        for source in overflow:
+            line = format_source(source)
+            cost = estimate_tokens(line)
+            if current and current_tokens + cost > self.chunk_tokens:
+                chunks.append("\n".join(current))
+                current, current_tokens = [], 0
+            current.append(line[: self.chunk_tokens * 4])
+            current_tokens += min(cost, self.chunk_tokens)
+        if current:
+            chunks.append("\n".join(current))
+
+        per_chunk = max(1, max_tokens // len(chunks)) if len(chunks) > 1 else max_tokens
+        if self.executor is not None and len(chunks) > 1:
+            partials = list(self.executor.map(lambda c: self.summarize(c, per_chunk), chunks))
+        else:
+            partials = [self.summarize(c, per_chunk) for c in chunks]
+        calls = len(chunks)
+
+        # Reduce: merge the partial summaries only if together they are over budget.
+        summary = "\n".join(partials)
+        if estimate_tokens(summary) > max_tokens:
+            summary = self.summarize(summary, max_tokens)
+            calls += 1
+        return summary, calls
+
+    def pack(self, sources: List[Dict], queries: Iterable[str]) -> PackedContext:
+        """
+        Build the research context for `sources`, ranked against `queries`.
+        Returns:
+            A PackedContext whose `text` fits within `token_budget` (by estimate).
+        """
+        ranked = rank_results([dict(s) for s in sources], list(queries))
+        available = sum(estimate_tokens(format_source(s)) + 1 for s in ranked)
+
+        included, overflow = self._fill(ranked, self.token_budget)
+        summary, calls = "", 0
+        if overflow and self.summarize is not None:
+            # Re-fill with room reserved for the summary of what did not fit.
+            summary_budget = int(self.token_budget * self.summary_share)
+            included, overflow = self._fill(ranked, self.token_budget - summary_budget)
+            summary, calls = self._summarize_overflow(overflow, summary_budget)
+
+        lines = [format_source(s) for s in included]
+        if summary:
+            lines.append(f"Summary of {len(overflow)} further sources:\n{summary}")
+        text = "\n".join(lines)
+        return PackedContext(text, included, overflow, summary, estimate_tokens(text) if text else 0,
+                             available, self.token_budget, calls)
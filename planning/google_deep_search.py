@@ -1,25 +1,163 @@
 import google.generativeai as genai
-from typing import List, Dict
+from typing import List, Dict, Iterable
+import hashlib
+import json
 import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import quote_plus
 from dotenv import load_dotenv
 
+from context_packer import ContextPacker, rank_results
+from research_plan import CoverageTracker, parse_planned_queries
+from research_state import ResearchContext, SourceCache, normalize_url
+
 # Load environment variables
 load_dotenv()
 
 # Configure Google Gemini API
 genai.configure(api_key=os.getenv('GOOGLE_API_KEY'))
 
+_WORD = re.compile(r"[a-z0-9]+")
+
+def content_hash(result: Dict) -> str:
+    """Hash of a result's normalized text, to catch the same content under different URLs."""
+    text = " ".join(_WORD.findall(f"{result.get('title', '')} {result.get('snippet', '')}".lower()))
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+def dedupe_results(results: Iterable[Dict]) -> List[Dict]:
+    """
+    Drop results whose normalized URL or content hash was already seen.
+    The surviving result records every query that found it in `queries`.
+    """
+    unique: List[Dict] = []
+    by_key: Dict[str, Dict] = {}
+    for result in results:
+        keys = ("url:" + normalize_url(result.get("url", "")), "hash:" + content_hash(result))
+        existing = next((by_key[k] for k in keys if k in by_key), None)
+        if existing is not None:
+            if result.get("query") and result["query"] not in existing["queries"]:
+                existing["queries"].append(result["query"])
+            continue
+        result = dict(result, queries=[result["query"]] if result.get("query") else [])
+        unique.append(result)
+        for k in keys:
+            by_key[k] = result
+    return unique
+
 class GoogleDeepSearch:
-    def __init__(self):
+    def __init__(self, max_search_workers: int = 8, source_cache: SourceCache = None,
+                 context_token_budget: int = None, summarize_overflow: bool = None):
         self.model = genai.GenerativeModel('models/gemini-2.5-flash')
-        self.search_results = []
+        # Shared across requests and bounded; per-request state lives on ResearchContext.
+        if source_cache is None:
+            source_cache = SourceCache(
+                max_sources=int(os.getenv("DEEP_SEARCH_CACHE_SIZE", "2000")),
+                ttl_seconds=float(os.getenv("DEEP_SEARCH_CACHE_TTL", "3600")),
+            )
+        self.source_cache = source_cache
+        # Planned queries are searched concurrently; web_search is I/O bound.
+        self.max_search_workers = max_search_workers
+        self._search_pool = ThreadPoolExecutor(max_workers=max_search_workers, thread_name_prefix="web-search")
+        # The report prompt gets the most relevant sources that fit the budget;
+        # optionally the rest is condensed by map-reduce summarization.
+        if context_token_budget is None:
+            context_token_budget = int(os.getenv("DEEP_SEARCH_CONTEXT_TOKENS", "8000"))
+        if summarize_overflow is None:
+            summarize_overflow = os.getenv("DEEP_SEARCH_SUMMARIZE_OVERFLOW", "0") == "1"
+        self.context_packer = ContextPacker(
+            token_budget=context_token_budget,
+            summarize=self._summarize if summarize_overflow else None,
+            executor=self._search_pool,
+        )
         
     def web_search(self, query: str) -> List[Dict]:
         """Simulate web search - replace with actual search API"""
         # This is a placeholder - integrate with Google Search API or similar
-        return [{"title": f"Result for {query}", "url": "https://example.com", "snippet": "Sample content"}]
+        return [{"title": f"Result for {query}", "url": f"https://example.com/search?q={quote_plus(query)}", "snippet": "Sample content"}]
+
+    def _summarize(self, text: str, max_tokens: int) -> str:
+        """Condense overflow sources for the report context (map/reduce step of the packer)."""
+        prompt = f"""
+        Summarize the key facts, figures and source titles below in at most {max_tokens * 3 // 4} words.
+        Keep the source titles so the facts can still be cited.
+        
+        {text}
+        """
+        return self.model.generate_content(prompt).text.strip()
+
+    def _cached_search(self, query: str) -> List[Dict]:
+        cached = self.source_cache.lookup(query)
+        if cached is not None:
+            return cached
+        return self.source_cache.remember(query, self.web_search(query))
+
+    def search_all(self, queries: List[str], rank_by: List[str] = None) -> List[Dict]:
+        """
+        Run `web_search` for every query concurrently (up to `max_search_workers` at once),
+        then deduplicate by URL and content hash and rank by relevance.
+        Args:
+            queries: Search queries to execute.
+            rank_by: Texts to rank against (e.g. the user query plus the queries); defaults to `queries`.
+        Returns:
+            Unique results, most relevant first. A failing query is reported and skipped.
+        """
+        return rank_results(dedupe_results(self._gather(queries)), rank_by or queries)
+
+    def _gather(self, queries: List[str]) -> List[Dict]:
+        """Raw results of all `queries`, searched concurrently, each tagged with its query."""
+        futures = [(query, self._search_pool.submit(self._cached_search, query)) for query in queries]
+        results = []
+        for query, future in futures:
+            try:
+                results.extend(dict(hit, query=query) for hit in future.result())
+            except Exception as e:
+                print(f"Search failed for '{query}': {e}")
+        return results
+
+    def _research_rounds(self, ctx: ResearchContext, max_rounds: int) -> None:
+        """
+        Iterative research: search, measure coverage of the topic's key terms, and
+        ask for follow-up queries only for the gaps. Stops at `max_rounds`, when
+        coverage is reached or plateaus, or when no new follow-up query is proposed.
+        """
+        tracker = CoverageTracker([ctx.user_query, *ctx.search_queries])
+        queries, raw = list(ctx.search_queries), []
+        for round_number in range(1, max_rounds + 1):
+            round_results = self._gather(queries)
+            raw.extend(round_results)
+            ctx.sources = rank_results(dedupe_results(raw), [ctx.user_query, *ctx.search_queries])
+            stats = tracker.update(ctx.sources, (normalize_url(r.get("url", "")) for r in round_results))
+            ctx.rounds.append(dict(stats, round=round_number, queries=len(queries)))
+            print(f"Round {round_number}: {len(queries)} queries, coverage {stats['coverage']:.0%} "
+                  f"(+{stats['gain']:.0%}), novelty {stats['novelty']:.0%}")
+            if round_number == max_rounds or tracker.should_stop():
+                break
+            queries = self._follow_up_queries(ctx, tracker.gaps())
+            if not queries:
+                break
+            ctx.search_queries.extend(queries)
+
+    def _follow_up_queries(self, ctx: ResearchContext, gaps: List[str]) -> List[str]:
+        """Ask the planner for queries targeting uncovered terms; drops queries already run."""
+        prompt = f"""
+        Research Query: {ctx.user_query}
+        
+        Queries already searched: {json.dumps(ctx.search_queries)}
+        The sources found so far do not cover: {", ".join(gaps)}
+        
+        Suggest at most {len(gaps)} new search queries that target only these gaps.
+        Format your response as a JSON list of search queries.
+        """
+        response = self.model.generate_content(prompt)
+        done = {q.lower() for q in ctx.search_queries}
+        return [q for q in parse_planned_queries(response.text, max_queries=len(gaps)) if q.lower() not in done]
     
-    def create_research_response(self, system_message: str, user_query: str):
+    def create_research_response(self, system_message: str, user_query: str,
+                                 iterative: bool = None, max_rounds: int = None):
+        # All state for this request lives on `ctx`, so concurrent calls are independent.
+        ctx = ResearchContext(system_message, user_query)
+        
         # Step 1: Generate research plan
         planning_prompt = f"""
         {system_message}
@@ -31,16 +169,30 @@ class GoogleDeepSearch:
         """
         
         planning_response = self.model.generate_content(planning_prompt)
+        ctx.reasoning = planning_response.text
+        ctx.mark("plan")
         
-        # Step 2: Execute searches (simulated)
-        search_queries = self._extract_queries(planning_response.text)
+        # Step 2: Execute searches concurrently (simulated), deduplicated and ranked;
+        # in iterative mode, follow up on coverage gaps until coverage plateaus
+        ctx.search_queries = self._extract_queries(planning_response.text, user_query)
+        if iterative is None:
+            iterative = os.getenv("DEEP_SEARCH_ITERATIVE", "0") == "1"
+        if iterative:
+            if max_rounds is None:
+                max_rounds = int(os.getenv("DEEP_SEARCH_MAX_ROUNDS", "3"))
+            self._research_rounds(ctx, max_rounds)
+        else:
+            ctx.sources = self.search_all(ctx.search_queries, rank_by=[user_query, *ctx.search_queries])
+        ctx.mark("search")
         
-        for query in search_queries:
-            results = self.web_search(query)
-            self.search_results.extend(results)
+        # Step 3: Pack the most relevant sources into the token budget
+        packed = self.context_packer.pack(ctx.sources, [user_query, *ctx.search_queries])
+        research_context = packed.text
+        ctx.context_stats = packed.stats()
+        ctx.mark("pack")
+        print(packed.report())
         
-        # Step 3: Generate final report
-        research_context = "\n".join([f"Source: {r['title']} - {r['snippet']}" for r in self.search_results])
+        # Step 4: Generate final report
         
         final_prompt = f"""
         {system_message}
@@ -54,18 +206,17 @@ class GoogleDeepSearch:
         """
         
         final_response = self.model.generate_content(final_prompt)
+        ctx.mark("report")
         
-        return {
-            'final_report': final_response.text,
-            'search_queries': search_queries,
-            'sources': self.search_results,
-            'reasoning': planning_response.text
-        }
+        return ctx.to_response(final_response.text)
     
-    def _extract_queries(self, planning_text: str) -> List[str]:
-        """Extract search queries from planning response"""
-        # Simple extraction - improve based on actual response format
-        return ["economic impact semaglutide", "healthcare cost reduction GLP-1", "semaglutide market analysis"]
+    def _extract_queries(self, planning_text: str, user_query: str) -> List[str]:
+        """Extract search queries from planning response, falling back to the user query"""
+        queries = parse_planned_queries(planning_text)
+        if not queries:
+            print("Could not parse search queries from the plan; searching the original query.")
+            queries = [user_query]
+        return queries
 
 # Usage example
 if __name__ == "__main__":
@@ -93,4 +244,10 @@ if __name__ == "__main__":
         print(f"{i}. {source['title']} - {source['url']}")
     
     print("\n=== REASONING ===")
-    print(response['reasoning'])
\ No newline at end of file
+    print(response['reasoning'])
+    
+    print("\n=== TIMINGS ===")
+    print(response['timings'])
+    for research_round in response['rounds']:
+        print(research_round)
+    print(deep_search.source_cache.summary())
\ No newline at end of file
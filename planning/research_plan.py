@@ -0,0 +1,157 @@
+"""
+Planner-output parsing and coverage tracking for iterative deep research.
+
+`parse_planned_queries` reads the search queries out of the planner's reply:
+strict JSON first, then the first JSON array embedded in prose or a code fence,
+then bulleted / numbered / quoted lines, so a slightly malformed reply still
+yields usable queries instead of an error.
+
+`CoverageTracker` measures how much of the research topic the gathered sources
+cover (the share of key query terms that appear in at least one source) and
+how many sources each round added that were new. The iterative loop asks for
+follow-up queries only for uncovered terms, and stops once coverage is high
+enough or either metric plateaus (little coverage gain, or mostly sources
+already seen).
+"""
+import json
+import re
+from typing import Dict, Iterable, List, Optional, Set
+
+_WORD = re.compile(r"[a-z0-9]+")
+_FENCE = re.compile(r"```(?:json)?\s*(.*?)```", re.DOTALL)
+_ARRAY = re.compile(r"\[.*\]", re.DOTALL)
+_LIST_ITEM = re.compile(r"^\s*(?:[-*•]|\d+[.)])\s+(.+?)\s*$")
+_QUOTED = re.compile(r'"([^"\n]{3,200})"')
+_QUERY_KEYS = ("query", "search_query", "q", "question")
+_LIST_KEYS = ("queries", "search_queries", "searches", "questions")
+_STOPWORDS = frozenset(
+    "a an and are as at be by for from has have how in into is it its of on or that the their "
+    "this to was what when where which who why will with about research impact analysis".split()
+)
+
+
+def _as_query(item) -> Optional[str]:
+    if isinstance(item, str):
+        return item
+    if isinstance(item, dict):
+        for key in _QUERY_KEYS:
+            if isinstance(item.get(key), str):
+                return item[key]
+    return None
+
+
+def _from_json(value) -> List[str]:
+    if isinstance(value, dict):
+        for key in _LIST_KEYS:
+            if isinstance(value.get(key), list):
+                value = value[key]
+                break
+        else:
+            return []
+    if not isinstance(value, list):
+        return []
+    return [q for q in (_as_query(item) for item in value) if q]
+
+
+def parse_planned_queries(planning_text: str, max_queries: int = 8) -> List[str]:
+    """
+    Extract search queries from a planner response.
+    Args:
+        planning_text: Raw model output, ideally a JSON list of queries.
+        max_queries: Upper bound on the number of queries returned.
+    Returns:
+        Unique, non-empty queries in planner order; empty if nothing usable was found.
+    """
+    candidates = [planning_text.strip()]
+    candidates += _FENCE.findall(planning_text)
+    candidates += _ARRAY.findall(planning_text)
+
+    queries: List[str] = []
+    for candidate in candidates:
+        try:
+            queries = _from_json(json.loads(candidate))
+        except ValueError:
+            continue
+        if queries:
+            break
+
+    if not queries:
+        # Prose fallback: list items first, then quoted phrases.
+        lines = planning_text.splitlines()
+        queries = [m.group(1) for m in map(_LIST_ITEM.match, lines) if m]
+        if not queries:
+            queries = _QUOTED.findall(planning_text)
+
+    unique, seen = [], set()
+    for query in queries:
+        query = query.strip().strip('"\'`,').strip()
+        if query and query.lower() not in seen:
+            seen.add(query.lower())
+            unique.append(query)
+    return unique[:max_queries]
+
+
+def key_terms(texts: Iterable[str]) -> Set[str]:
+    """Content words of the research topic (lowercased, stopwords and short tokens removed)."""
+    return {t for t in _WORD.findall(" ".join(texts).lower()) if len(t) > 2 and t not in _STOPWORDS}
+
+
+class CoverageTracker:
+    """
+    Tracks topic coverage and per-round novelty across research rounds.
+    Args:
+        topic_texts: The user query and planned queries that define the topic.
+        target_coverage: Stop once this share of key terms is covered.
+        min_gain: A round that raises coverage by less than this has plateaued.
+        min_novelty: So has a round in which less than this share of sources was new.
+    """
+
+    def __init__(self, topic_texts: Iterable[str], target_coverage: float = 0.9,
+                 min_gain: float = 0.05, min_novelty: float = 0.2):
+        self.terms = key_terms(topic_texts)
+        self.target_coverage = target_coverage
+        self.min_gain = min_gain
+        self.min_novelty = min_novelty
+        self.covered: Set[str] = set()
+        self.seen_urls: Set[str] = set()
+        self.history: List[Dict[str, float]] = []
+
+    @property
+    def coverage(self) -> float:
+        return len(self.covered) / len(self.terms) if self.terms else 1.0
+
+    def gaps(self) -> List[str]:
+        """Key terms not found in any gathered source."""
+        return sorted(self.terms - self.covered)
+
+    def update(self, sources: List[Dict], urls: Iterable[str]) -> Dict[str, float]:
+        """
+        Record one round of sources.
+        Args:
+            sources: All sources gathered so far (coverage is over the union).
+            urls: Normalized URLs of the sources returned in this round.
+        Returns:
+            The round's coverage, coverage gain and novelty (share of new sources).
+        """
+        before = self.coverage
+        text = " ".join(f"{s.get('title', '')} {s.get('snippet', '')}" for s in sources)
+        self.covered = self.terms & set(_WORD.findall(text.lower()))
+        urls = list(urls)
+        new = [u for u in urls if u not in self.seen_urls]
+        self.seen_urls.update(urls)
+        round_stats = {
+            "coverage": round(self.coverage, 3),
+            "gain": round(self.coverage - before, 3),
+            "novelty": round(len(new) / len(urls), 3) if urls else 0.0,
+        }
+        self.history.append(round_stats)
+        return round_stats
+
+    def should_stop(self) -> bool:
+        """True when coverage reached the target or the last round plateaued."""
+        if self.coverage >= self.target_coverage or not self.gaps():
+            return True
+        if len(self.history) < 2:
+            return False
+        last = self.history[-1]
+        return last["gain"] < self.min_gain or last["novelty"] < self.min_novelty
@@ -0,0 +1,144 @@
+"""
+Per-request research state and a shared, bounded source cache for GoogleDeepSearch.
+
+Everything one research request gathers lives on its own `ResearchContext`, so
+concurrent requests on one `GoogleDeepSearch` never see each other's sources
+and nothing accumulates on the instance. What is worth sharing across requests
+(search results) goes through `SourceCache`: sources are kept once per
+normalized URL, evicted LRU-first beyond `max_sources` and expired after a TTL,
+so memory stays flat however many requests an instance serves.
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+_TRACKING_PARAMS = ("utm_", "fbclid", "gclid")
+
+
+def normalize_url(url: str) -> str:
+    """Canonical form of a URL for deduplication (case, trailing slash, fragment, tracking params)."""
+    parts = urlsplit(url.strip())
+    query = urlencode(sorted(
+        (k, v) for k, v in parse_qsl(parts.query) if not k.lower().startswith(_TRACKING_PARAMS)
+    ))
+    host = parts.netloc.lower()
+    if host.startswith("www."):
+        host = host[4:]
+    return urlunsplit((parts.scheme.lower() or "https", host, parts.path.rstrip("/"), query, ""))
+
+
+class SourceCache:
+    """
+    Thread-safe LRU + TTL cache of search results, shared by all requests.
+    Sources are stored once per normalized URL; each query remembers only the
+    URLs it returned, so a cached query is served only while all of its sources
+    are still cached.
+    Args:
+        max_sources: Maximum number of sources (and of remembered queries) kept.
+        ttl_seconds: How long a source or query result stays valid.
+    """
+
+    def __init__(self, max_sources: int = 2000, ttl_seconds: float = 3600):
+        self.max_sources = max_sources
+        self.ttl_seconds = ttl_seconds
+        self._sources: "OrderedDict[str, Tuple[Dict, float]]" = OrderedDict()
+        self._queries: "OrderedDict[str, Tuple[List[str], float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._sources)
+
+    def _get_source(self, key: str, now: float) -> Optional[Dict]:
+        entry = self._sources.get(key)
+        if entry is None or entry[1] <= now:
+            self._sources.pop(key, None)
+            return None
+        self._sources.move_to_end(key)
+        return entry[0]
+
+    def get(self, url: str) -> Optional[Dict]:
+        """Return the cached source for `url`, or None on a miss or expiry."""
+        with self._lock:
+            return self._get_source(normalize_url(url), time.time())
+
+    def put(self, source: Dict) -> Dict:
+        """Cache `source` by its URL and return the stored copy."""
+        key = normalize_url(source.get("url", ""))
+        with self._lock:
+            stored = dict(source)
+            self._sources[key] = (stored, time.time() + self.ttl_seconds)
+            self._sources.move_to_end(key)
+            while len(self._sources) > self.max_sources:
+                self._sources.popitem(last=False)
+            return stored
+
+    def lookup(self, query: str) -> Optional[List[Dict]]:
+        """Return the cached results for `query`, or None if any of them is gone."""
+        key = query.strip().lower()
+        now = time.time()
+        with self._lock:
+            entry = self._queries.get(key)
+            if entry is not None and entry[1] > now:
+                sources = [self._get_source(url, now) for url in entry[0]]
+                if all(s is not None for s in sources):
+                    self._queries.move_to_end(key)
+                    self.hits += 1
+                    return sources
+            self._queries.pop(key, None)
+            self.misses += 1
+            return None
+
+    def remember(self, query: str, results: List[Dict]) -> List[Dict]:
+        """Cache the results of `query`; returns the stored copies."""
+        stored = [self.put(r) for r in results]
+        with self._lock:
+            key = query.strip().lower()
+            self._queries[key] = ([normalize_url(s.get("url", "")) for s in stored],
+                                  time.time() + self.ttl_seconds)
+            self._queries.move_to_end(key)
+            while len(self._queries) > self.max_sources:
+                self._queries.popitem(last=False)
+        return stored
+
+    def summary(self) -> str:
+        total = self.hits + self.misses
+        rate = (self.hits / total * 100) if total else 0.0
+        return (f"Source cache: {len(self._sources)}/{self.max_sources} sources, "
+                f"{self.hits} query hits / {total} lookups ({rate:.0f}%)")
+
+
+class ResearchContext:
+    """
+    State of one research request. Created per call, so concurrent requests
+    on the same GoogleDeepSearch instance are isolated from each other.
+    """
+
+    def __init__(self, system_message: str, user_query: str):
+        self.system_message = system_message
+        self.user_query = user_query
+        self.reasoning = ""
+        self.search_queries: List[str] = []
+        self.sources: List[Dict] = []
+        self.timings: Dict[str, float] = {}
+        self.context_stats: Dict[str, int] = {}
+        self.rounds: List[Dict] = []
+        self._started = time.perf_counter()
+
+    def mark(self, step: str) -> None:
+        """Record the elapsed seconds at the end of `step`."""
+        self.timings[step] = round(time.perf_counter() - self._started, 3)
+
+    def to_response(self, final_report: str) -> Dict:
+        return {
+            'final_report': final_report,
+            'search_queries': self.search_queries,
+            'sources': self.sources,
+            'reasoning': self.reasoning,
+            'timings': self.timings,
+            'context_stats': self.context_stats,
+            'rounds': self.rounds,
+        }
@@ -0,0 +1,55 @@
+# This code is licensed under the MIT License.
+# See the LICENSE file in the repository for the full license text.
+"""
+Import-time benchmark for the lazy LLM client registry.
+
+Each measurement runs in a fresh interpreter so nothing is cached between runs.
+"lazy import" is what a worker pays today to import the module; "import + build
+client" is what importing used to cost when the ChatGoogleGenerativeAI client
+was constructed at module import.
+
+Usage:
+    python bench_cold_start.py [repeats]
+"""
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+TOOL_USE_DIR = os.path.join(HERE, "..", "tool_use")
+
+CASES = [
+    ("routing: lazy import", HERE,
+     "import langchain_routing"),
+    ("routing: import + build client", HERE,
+     "import langchain_routing as m; m.get_llm(m.ROUTER_MODEL, temperature=0)"),
+    ("tool_use: lazy import", TOOL_USE_DIR,
+     "import langchain_tool_use"),
+    ("tool_use: import + build client", TOOL_USE_DIR,
+     "import langchain_tool_use as m; m.get_llm_with_tools()"),
+]
+
+
+def time_snippet(cwd: str, code: str) -> float:
+    env = dict(os.environ)
+    # Client construction only needs a key to be present, not a valid one.
+    env.setdefault("GOOGLE_API_KEY", "benchmark-placeholder")
+    start = time.perf_counter()
+    subprocess.run([sys.executable, "-c", code], cwd=cwd, env=env, check=True,
+                   stdout=subprocess.DEVNULL)
+    return time.perf_counter() - start
+
+
+def main(repeats: int = 5) -> None:
+    print(f"Cold-start benchmark ({repeats} fresh interpreters per case, median wall time)")
+    baseline = time_snippet(HERE, "pass")
+    print(f"{'interpreter startup':<36}{baseline * 1e3:>10.0f} ms")
+    for label, cwd, code in CASES:
+        samples = [time_snippet(cwd, code) for _ in range(repeats)]
+        print(f"{label:<36}{statistics.median(samples) * 1e3:>10.0f} ms")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 5)
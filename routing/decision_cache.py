@@ -0,0 +1,136 @@
+# This code is licensed under the MIT License.
+# See the LICENSE file in the repository for the full license text.
+"""
+Routing decision cache for the coordinator router.
+
+Requests are normalized (case, whitespace, punctuation and, optionally, a light
+suffix stemmer) so that "Book me a flight to London." and
+"book me a flight to london" share one entry. Entries are evicted LRU-first
+and expire after a TTL. An optional SQLite file keeps decisions across restarts.
+"""
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+_PUNCTUATION = re.compile(r"[^\w\s]")
+_WHITESPACE = re.compile(r"\s+")
+_SUFFIXES = ("ing", "ed", "es", "s")
+
+
+def _stem(word: str) -> str:
+    """Strip one common English suffix; deliberately crude but dependency-free."""
+    for suffix in _SUFFIXES:
+        if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+            return word[: -len(suffix)]
+    return word
+
+
+def normalize_request(request: str, stem: bool = False) -> str:
+    """
+    Normalize a request into a cache key.
+    Args:
+        request: The raw user request.
+        stem: Also strip common suffixes ("flights" -> "flight").
+    Returns:
+        Lowercased text with punctuation removed and whitespace collapsed.
+    """
+    text = _PUNCTUATION.sub(" ", request.lower())
+    words = _WHITESPACE.sub(" ", text).strip().split(" ")
+    if stem:
+        words = [_stem(w) for w in words]
+    return " ".join(words)
+
+
+class DecisionCache:
+    """
+    LRU + TTL cache of routing decisions with optional SQLite persistence.
+    The in-memory map is the hot tier; SQLite is only read on an in-memory miss
+    and written on every put, so a restarted process warms up from disk.
+    """
+
+    def __init__(self, max_size: int = 10000, ttl_seconds: float = 24 * 3600,
+                 db_path: Optional[str] = None, stem: bool = False):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.stem = stem
+        self._entries: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+        self._db = None
+        if db_path:
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS decisions ("
+                "key TEXT PRIMARY KEY, label TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+            self._db.execute("DELETE FROM decisions WHERE expires_at <= ?", (time.time(),))
+            self._db.commit()
+
+    def key(self, request: str) -> str:
+        return normalize_request(request, stem=self.stem)
+
+    def get(self, request: str) -> Optional[str]:
+        """Return the cached decision for `request`, or None on a miss or expiry."""
+        key = self.key(request)
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] > now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            if entry is not None:
+                del self._entries[key]
+
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT label, expires_at FROM decisions WHERE key = ? AND expires_at > ?",
+                    (key, now),
+                ).fetchone()
+                if row is not None:
+                    self._store(key, row[0], row[1])
+                    self.hits += 1
+                    return row[0]
+
+            self.misses += 1
+            return None
+
+    def put(self, request: str, label: str) -> None:
+        """Cache `label` as the decision for `request`."""
+        key = self.key(request)
+        expires_at = time.time() + self.ttl_seconds
+        with self._lock:
+            self._store(key, label, expires_at)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO decisions (key, label, expires_at) VALUES (?, ?, ?)",
+                    (key, label, expires_at),
+                )
+                self._db.commit()
+
+    def _store(self, key: str, label: str, expires_at: float) -> None:
+        self._entries[key] = (label, expires_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def summary(self) -> str:
+        return (
+            f"Decision cache: {self.hits} hits / {self.misses} misses "
+            f"({self.hit_rate:.0%}), {len(self._entries)} entries in memory"
+        )
+
+    def close(self) -> None:
+        if self._db is not None:
+            self._db.close()
+            self._db = None
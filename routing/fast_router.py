@@ -0,0 +1,390 @@
+# This code is licensed under the MIT License.
+# See the LICENSE file in the repository for the full license text.
+"""
+Local fast-path intent classifier for the coordinator router.
+
+The coordinator router only ever emits one of three words ('booker', 'info',
+'unclear'), so most requests can be classified locally without a Gemini round
+trip. `FastPathRouter` first tries a set of keyword/regex rules, then a small
+hashed n-gram linear model trained from logged LLM decisions, and only falls
+back to the LLM router when neither is confident enough.
+"""
+import json
+import math
+import os
+import re
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+
+LABELS = ("booker", "info", "unclear")
+
+# --- Keyword / Regex Rules ---
+# Each rule is (pattern, label, confidence). Rules are checked in order and the
+# first match wins. Keep them conservative: anything ambiguous should fall
+# through to the model or the LLM.
+DEFAULT_RULES: List[Tuple[str, str, float]] = [
+    (r"\b(book|reserve|booking)\b.*\b(flights?|hotels?|rooms?|tickets?)\b", "booker", 0.97),
+    (r"\b(find|search|get)\b.*\b(flights?|hotels?)\b\s+(to|in|for|from)\b", "booker", 0.92),
+    (r"^(what|who|where|when|which|how (many|much|far|tall|old))\b.+\?$", "info", 0.9),
+    (r"^(hi|hello|hey|thanks|thank you|ok|okay)\W*$", "unclear", 0.95),
+]
+
+
+def normalize_label(label: str) -> str:
+    """Normalize a router output ("  'Booker'\\n") to a bare lowercase label."""
+    return label.strip().strip("'\"`.").lower()
+
+
+# --- Hashed N-gram Linear Model ---
+class HashedNgramClassifier:
+    """
+    Multinomial logistic regression over hashed word and character n-grams.
+
+    Features are hashed with CRC32 (stable across processes, unlike `hash()`)
+    into `n_buckets` slots, so the model size is bounded no matter how much
+    traffic it is trained on.
+    """
+
+    def __init__(self, labels: Iterable[str] = LABELS, n_buckets: int = 2 ** 18):
+        self.labels = list(labels)
+        self.n_buckets = n_buckets
+        self.weights: Dict[str, Dict[int, float]] = {label: {} for label in self.labels}
+        self.bias: Dict[str, float] = {label: 0.0 for label in self.labels}
+        self.n_trained = 0
+
+    def _features(self, text: str) -> Dict[int, float]:
+        words = re.findall(r"[a-z0-9']+", text.lower())
+        grams = list(words)
+        grams += [f"{a} {b}" for a, b in zip(words, words[1:])]
+        padded = f" {' '.join(words)} "
+        grams += [f"#{padded[i:i + 3]}" for i in range(len(padded) - 2)]
+
+        features: Dict[int, float] = {}
+        for gram in grams:
+            index = zlib.crc32(gram.encode("utf-8")) % self.n_buckets
+            features[index] = features.get(index, 0.0) + 1.0
+        # L2-normalize so long requests don't dominate the update size.
+        norm = math.sqrt(sum(v * v for v in features.values())) or 1.0
+        return {k: v / norm for k, v in features.items()}
+
+    def _scores(self, features: Dict[int, float]) -> Dict[str, float]:
+        return {
+            label: self.bias[label] + sum(self.weights[label].get(k, 0.0) * v for k, v in features.items())
+            for label in self.labels
+        }
+
+    def predict_proba(self, text: str) -> Dict[str, float]:
+        """Return a probability for every label."""
+        scores = self._scores(self._features(text))
+        top = max(scores.values())
+        exps = {label: math.exp(score - top) for label, score in scores.items()}
+        total = sum(exps.values())
+        return {label: value / total for label, value in exps.items()}
+
+    def predict(self, text: str) -> Tuple[str, float]:
+        """Return the most likely label and its probability."""
+        proba = self.predict_proba(text)
+        label = max(proba, key=proba.get)
+        return label, proba[label]
+
+    def fit(self, examples: List[Tuple[str, str]], epochs: int = 15, learning_rate: float = 0.5,
+            l2: float = 1e-4) -> "HashedNgramClassifier":
+        """
+        Train with plain SGD on (request, label) pairs.
+        Args:
+            examples: Logged routing decisions.
+            epochs: Number of passes over the examples.
+            learning_rate: SGD step size.
+            l2: L2 regularization strength.
+        Returns:
+            The classifier itself, for chaining.
+        """
+        featurized = [(self._features(text), label) for text, label in examples if label in self.labels]
+        for _ in range(epochs):
+            for features, target in featurized:
+                scores = self._scores(features)
+                top = max(scores.values())
+                exps = {label: math.exp(score - top) for label, score in scores.items()}
+                total = sum(exps.values())
+                for label in self.labels:
+                    gradient = exps[label] / total - (1.0 if label == target else 0.0)
+                    weights = self.weights[label]
+                    for k, v in features.items():
+                        w = weights.get(k, 0.0)
+                        weights[k] = w - learning_rate * (gradient * v + l2 * w)
+                    self.bias[label] -= learning_rate * gradient
+        self.n_trained = len(featurized)
+        return self
+
+
+# --- Decision Log ---
+class DecisionLog:
+    """
+    Append-only JSONL log of (request, label) decisions made by the LLM router.
+    A request already logged with the same label is not logged again, and
+    `load` returns only the newest `max_examples` distinct requests (latest
+    label wins). Once the file holds twice that many lines it is compacted to
+    that window, so neither the file nor training time grows with traffic.
+    """
+
+    def __init__(self, path: Optional[str], max_examples: int = 1000):
+        self.path = path
+        self.max_examples = max_examples
+        self._lock = threading.Lock()
+        self._seen: Optional[Dict[str, str]] = None  # request key -> last logged label
+        self._lines = 0
+
+    @staticmethod
+    def _key(request: str) -> str:
+        return " ".join(request.lower().split())
+
+    def _read(self) -> "OrderedDict[str, Tuple[str, str]]":
+        """Distinct logged requests, oldest first by their last occurrence."""
+        entries: "OrderedDict[str, Tuple[str, str]]" = OrderedDict()
+        self._lines = 0
+        if not self.path or not os.path.exists(self.path):
+            return entries
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                    request, label = entry["request"], entry["label"]
+                except (ValueError, KeyError):
+                    continue  # Skip partially written lines
+                self._lines += 1
+                key = self._key(request)
+                entries.pop(key, None)
+                entries[key] = (request, label)
+        return entries
+
+    def load(self) -> List[Tuple[str, str]]:
+        with self._lock:
+            entries = self._read()
+            self._seen = {key: label for key, (_, label) in entries.items()}
+        return list(entries.values())[-self.max_examples:]
+
+    def append(self, request: str, label: str) -> None:
+        if not self.path:
+            return
+        key = self._key(request)
+        with self._lock:
+            if self._seen is None:
+                self._seen = {k: l for k, (_, l) in self._read().items()}
+            if self._seen.get(key) == label:
+                return
+            self._seen[key] = label
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps({"request": request, "label": label}) + "\n")
+            self._lines += 1
+            if self._lines > 2 * self.max_examples:
+                self._compact()
+
+    def _compact(self) -> None:
+        """Rewrite the log as its newest `max_examples` distinct decisions."""
+        entries = list(self._read().values())[-self.max_examples:]
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for request, label in entries:
+                f.write(json.dumps({"request": request, "label": label}) + "\n")
+        os.replace(tmp_path, self.path)
+        self._lines = len(entries)
+        self._seen = {self._key(request): label for request, label in entries}
+
+
+# --- Counters ---
+class FastPathStats:
+    """Hit-rate and latency counters for the fast path vs. the LLM fallback."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.rule_hits = 0
+        self.model_hits = 0
+        self.fallbacks = 0
+        self.local_seconds = 0.0
+        self.llm_seconds = 0.0
+
+    def record_local(self, source: str, seconds: float) -> None:
+        with self._lock:
+            if source == "rule":
+                self.rule_hits += 1
+            elif source == "model":
+                self.model_hits += 1
+            self.local_seconds += seconds
+
+    def record_fallback(self, seconds: float) -> None:
+        with self._lock:
+            self.fallbacks += 1
+            self.llm_seconds += seconds
+
+    @property
+    def total(self) -> int:
+        return self.rule_hits + self.model_hits + self.fallbacks
+
+    @property
+    def hit_rate(self) -> float:
+        return (self.rule_hits + self.model_hits) / self.total if self.total else 0.0
+
+    def as_dict(self) -> Dict[str, float]:
+        hits = self.rule_hits + self.model_hits
+        avg_llm = self.llm_seconds / self.fallbacks if self.fallbacks else 0.0
+        return {
+            "requests": self.total,
+            "rule_hits": self.rule_hits,
+            "model_hits": self.model_hits,
+            "llm_fallbacks": self.fallbacks,
+            "hit_rate": self.hit_rate,
+            # Every request classifies locally first, so divide by the total.
+            "avg_local_us": self.local_seconds / self.total * 1e6 if self.total else 0.0,
+            "avg_llm_ms": avg_llm * 1e3,
+            "round_trips_saved": hits,
+            "estimated_seconds_saved": hits * avg_llm,
+        }
+
+    def summary(self) -> str:
+        d = self.as_dict()
+        return (
+            f"Fast path: {d['rule_hits'] + d['model_hits']}/{d['requests']} requests "
+            f"({d['hit_rate']:.0%}) answered locally "
+            f"[rules={d['rule_hits']}, model={d['model_hits']}], "
+            f"avg local {d['avg_local_us']:.0f}us, "
+            f"avg LLM {d['avg_llm_ms']:.0f}ms over {d['llm_fallbacks']} fallbacks, "
+            f"~{d['estimated_seconds_saved']:.2f}s saved"
+        )
+
+
+# --- Fast-Path Router ---
+class FastPathRouter:
+    """
+    Pre-router that answers high-confidence requests locally.
+    Rules are tried first, then the n-gram model (once it has seen at least
+    `min_examples` logged decisions). Anything below `threshold` confidence
+    goes to the LLM fallback, whose answer is logged for the next retrain.
+    A router built with `from_log` trains in a background thread on first use,
+    so importing or constructing it never waits on training.
+    """
+
+    def __init__(self, rules: Optional[List[Tuple[str, str, float]]] = None,
+                 model: Optional[HashedNgramClassifier] = None, threshold: float = 0.85,
+                 min_examples: int = 20, log: Optional[DecisionLog] = None):
+        self.rules = [(re.compile(p, re.IGNORECASE), label, conf)
+                      for p, label, conf in (DEFAULT_RULES if rules is None else rules)]
+        self.model = model
+        self.threshold = threshold
+        self.min_examples = min_examples
+        self.log = log or DecisionLog(None)
+        self.stats = FastPathStats()
+        # Label frequencies from the decision log; used as a prior when nothing else applies.
+        self.prior: Dict[str, float] = {label: 1.0 / len(LABELS) for label in LABELS}
+        self._training: Optional[threading.Thread] = None
+        self._pending_training = False
+        self._training_lock = threading.Lock()
+
+    @classmethod
+    def from_log(cls, path: Optional[str], max_examples: int = 1000, **kwargs) -> "FastPathRouter":
+        """
+        Build a router whose model is trained on the newest `max_examples`
+        decisions of a JSONL decision log. Training starts on first use.
+        """
+        router = cls(log=DecisionLog(path, max_examples), **kwargs)
+        router._pending_training = True
+        return router
+
+    def _start_training(self) -> None:
+        """Train from the log in a background thread; rules and the prior serve until it is done."""
+        with self._training_lock:
+            if not self._pending_training:
+                return
+            self._pending_training = False
+            self._training = threading.Thread(target=self.retrain, name="fast-router-training", daemon=True)
+            self._training.start()
+
+    def wait_until_trained(self, timeout: Optional[float] = None) -> None:
+        """Start training if it is pending and block until it finishes."""
+        self._start_training()
+        if self._training is not None:
+            self._training.join(timeout)
+
+    def retrain(self, examples: Optional[List[Tuple[str, str]]] = None) -> None:
+        """(Re)train the n-gram model from `examples` or from the decision log."""
+        self._pending_training = False
+        examples = self.log.load() if examples is None else examples
+        counts = {label: 1.0 for label in LABELS}  # Laplace smoothing
+        for _, label in examples:
+            if label in counts:
+                counts[label] += 1
+        total = sum(counts.values())
+        self.prior = {label: count / total for label, count in counts.items()}
+        if len(examples) >= self.min_examples:
+            self.model = HashedNgramClassifier().fit(examples)
+
+    def classify(self, request: str) -> Tuple[Optional[str], float, str]:
+        """
+        Classify locally without any network call.
+        Returns:
+            (label, confidence, source) where source is 'rule', 'model' or 'none'.
+        """
+        if self._pending_training:
+            self._start_training()
+        text = request.strip()
+        for pattern, label, confidence in self.rules:
+            if pattern.search(text):
+                return label, confidence, "rule"
+        if self.model is not None and self.model.n_trained >= self.min_examples:
+            label, confidence = self.model.predict(text)
+            return label, confidence, "model"
+        return None, 0.0, "none"
+
+    def rank(self, request: str) -> List[Tuple[str, float]]:
+        """
+        Rank every label by local likelihood, most likely first.
+        Uses the matching rule if any, else the n-gram model, else the logged prior.
+        Unlike `route`, this never abstains, so it can drive speculative execution.
+        """
+        label, confidence, source = self.classify(request)
+        if source == "model":
+            proba = self.model.predict_proba(request)
+        elif source == "rule":
+            rest = (1.0 - confidence) / (len(LABELS) - 1)
+            proba = {other: (confidence if other == label else rest) for other in LABELS}
+        else:
+            proba = dict(self.prior)
+        return sorted(proba.items(), key=lambda item: item[1], reverse=True)
+
+    def route(self, request: str) -> Optional[str]:
+        """Return a label if the fast path is confident enough, otherwise None."""
+        start = time.perf_counter()
+        label, confidence, source = self.classify(request)
+        hit = label is not None and confidence >= self.threshold
+        # A miss still spends local time, so it is counted against the local budget too.
+        self.stats.record_local(source if hit else "miss", time.perf_counter() - start)
+        return label if hit else None
+
+    def decide(self, request: str, fallback: Callable[[str], str]) -> str:
+        """
+        Route `request`, calling `fallback` (the LLM router) only on a fast-path miss.
+        The fallback's decision is logged so the model can be retrained on it.
+        """
+        label = self.route(request)
+        if label is not None:
+            return label
+        start = time.perf_counter()
+        label = normalize_label(fallback(request))
+        self.stats.record_fallback(time.perf_counter() - start)
+        if label in LABELS:
+            self.log.append(request, label)
+        return label
+
+    async def adecide(self, request: str, fallback: Callable[[str], Awaitable[str]]) -> str:
+        """Async variant of `decide` for an awaitable LLM fallback."""
+        label = self.route(request)
+        if label is not None:
+            return label
+        start = time.perf_counter()
+        label = normalize_label(await fallback(request))
+        self.stats.record_fallback(time.perf_counter() - start)
+        if label in LABELS:
+            self.log.append(request, label)
+        return label
@@ -5,22 +5,25 @@ from dotenv import load_dotenv
 # This code is licensed under the MIT License.
 # See the LICENSE file in the repository for the full license text.
 import os
+import asyncio
+import time
+from typing import AsyncIterator, Iterable, List, Sequence, Tuple
 from dotenv import load_dotenv
-from langchain_google_genai import ChatGoogleGenerativeAI
+from decision_cache import DecisionCache
+from fast_router import FastPathRouter, LABELS
+from llm_clients import get_llm, lazy_llm
+from speculation import SpeculationStats, run_speculative
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import StrOutputParser
-from langchain_core.runnables import RunnablePassthrough, RunnableBranch
+from langchain_core.runnables import RunnablePassthrough, RunnableBranch, RunnableLambda
 
 load_dotenv()
 load_dotenv()
 # --- Configuration ---
 # Ensure your API key environment variable is set (e.g., GOOGLE_API_KEY)
-try:
-    llm = ChatGoogleGenerativeAI(model="gemini-2.5-flash", temperature=0)
-    print(f"Language model initialized: {llm.model}")
-except Exception as e:
-    print(f"Error initializing language model: {e}")
-    llm = None
+# The client is built lazily on the first router call (see llm_clients.py), so
+# importing this module composes the chains without any network setup.
+ROUTER_MODEL = "gemini-2.5-flash"
 
 # --- Define Simulated Sub-Agent Handlers (equivalent to ADK sub_agents) ---
 def booking_handler(request: str) -> str:
@@ -49,10 +52,56 @@ ONLY output one word: 'booker', 'info', or 'unclear'."""),
     ("user", "{request}")
 ])
 
-if llm:
-    coordinator_router_chain = coordinator_router_prompt | llm | StrOutputParser()
-else:
-    coordinator_router_chain = None
+coordinator_router_chain = coordinator_router_prompt | lazy_llm(ROUTER_MODEL, temperature=0) | StrOutputParser()
+
+# --- Define the Fast-Path Pre-Router ---
+# Answers high-confidence requests locally (rules + hashed n-gram model trained
+# from logged LLM decisions) and only calls the LLM router below the threshold.
+# The model trains in the background on first use, on the newest
+# ROUTER_TRAIN_WINDOW distinct logged decisions.
+fast_router = FastPathRouter.from_log(
+    os.getenv("ROUTER_DECISION_LOG", os.path.join(os.path.dirname(__file__), "router_decisions.jsonl")),
+    max_examples=int(os.getenv("ROUTER_TRAIN_WINDOW", "1000")),
+    threshold=float(os.getenv("ROUTER_FAST_PATH_THRESHOLD", "0.85")),
+)
+
+# --- Define the Routing Decision Cache ---
+# Near-identical requests share one normalized key, so repeats skip both the
+# fast path and the LLM. Set ROUTER_CACHE_DB to persist decisions across restarts.
+decision_cache = DecisionCache(
+    max_size=int(os.getenv("ROUTER_CACHE_SIZE", "10000")),
+    ttl_seconds=float(os.getenv("ROUTER_CACHE_TTL", str(24 * 3600))),
+    db_path=os.getenv("ROUTER_CACHE_DB") or None,
+    stem=os.getenv("ROUTER_CACHE_STEM", "0") == "1",
+)
+
+def route_decision(x: dict) -> str:
+    """Return the routing decision from the cache, the fast path, or the LLM router, in that order."""
+    request = x['request']
+    decision = decision_cache.get(request)
+    if decision is not None:
+        return decision
+    decision = fast_router.decide(
+        request,
+        lambda r: coordinator_router_chain.invoke({"request": r}),
+    )
+    if decision in LABELS:
+        decision_cache.put(request, decision)
+    return decision
+
+async def aroute_decision(x: dict) -> str:
+    """Async variant of `route_decision`; awaits the LLM router instead of blocking."""
+    request = x['request']
+    decision = decision_cache.get(request)
+    if decision is not None:
+        return decision
+    decision = await fast_router.adecide(
+        request,
+        lambda r: coordinator_router_chain.ainvoke({"request": r}),
+    )
+    if decision in LABELS:
+        decision_cache.put(request, decision)
+    return decision
 
 # --- Define the Delegation Logic (equivalent to ADK's Auto-Flow based on sub_agents) ---
 # Use RunnableBranch to route based on the router chain's output.
@@ -63,6 +112,9 @@ branches = {
     "unclear": RunnablePassthrough.assign(output=lambda x: unclear_handler(x['request']['request'])),
 }
 
+# The handlers are plain blocking functions; when the chain runs via ainvoke,
+# LangChain executes sync lambdas in a thread pool, so they never block the event loop.
+
 # Create the RunnableBranch. It takes the output of the router chain
 # and routes the original input ('request') to the corresponding handler.
 delegation_branch = RunnableBranch(
@@ -74,17 +126,149 @@ delegation_branch = RunnableBranch(
 # Combine the router chain and the delegation branch into a single runnable
 # The router chain's output ('decision') is passed along with the original input ('request')
 # to the delegation_branch.
-if coordinator_router_chain:
-    coordinator_agent = {
-        "decision": coordinator_router_chain,
-        "request": RunnablePassthrough()
-    } | delegation_branch | (lambda x: x['output'])  # Extract the final output
-else:
-    coordinator_agent = None
+coordinator_agent = {
+    "decision": RunnableLambda(route_decision, afunc=aroute_decision),
+    "request": RunnablePassthrough()
+} | delegation_branch | (lambda x: x['output'])  # Extract the final output
+
+# --- Speculative Execution ---
+# Start the most likely handler(s) while the router is still deciding. Only
+# handlers listed in ROUTER_SPECULATIVE_LABELS are ever speculated on. The
+# default leaves out 'booker': a real booking handler has side effects.
+HANDLERS = {"booker": booking_handler, "info": info_handler, "unclear": unclear_handler}
+SPECULATIVE_LABELS = os.getenv("ROUTER_SPECULATIVE_LABELS", "info,unclear").split(",")
+speculation_stats = SpeculationStats()
+
+async def aspeculative_invoke(request: str, max_speculations: int = 1, min_likelihood: float = 0.2) -> str:
+    """
+    Route `request`, speculatively running likely handlers in parallel with the router.
+    Args:
+        request: The user request.
+        max_speculations: Maximum number of handlers started before the decision lands.
+        min_likelihood: Only speculate on labels the fast path rates at least this likely.
+    Returns:
+        The output of the handler selected by the router.
+    """
+    guesses = [
+        label for label, likelihood in fast_router.rank(request)
+        if likelihood >= min_likelihood and label in SPECULATIVE_LABELS
+    ][:max_speculations]
+    _, result = await run_speculative(
+        request,
+        lambda: aroute_decision({"request": request}),
+        HANDLERS,
+        guesses,
+        default="unclear",
+        stats=speculation_stats,
+    )
+    return result
+
+# --- Batched Routing ---
+def latency_percentiles(latencies: Sequence[float], percentiles: Sequence[int] = (50, 90, 95, 99)) -> dict:
+    """Return nearest-rank latency percentiles in milliseconds."""
+    if not latencies:
+        return {}
+    ordered = sorted(latencies)
+    return {
+        f"p{p}": ordered[min(len(ordered) - 1, max(0, -(-p * len(ordered) // 100) - 1))] * 1e3
+        for p in percentiles
+    }
+
+async def aroute_stream(requests: Iterable[str], max_concurrency: int = 16,
+                        speculative: bool = False) -> AsyncIterator[Tuple[int, str, float]]:
+    """
+    Route many requests concurrently and yield results as they complete.
+    At most `max_concurrency` requests are in flight at once, and requests are
+    only pulled from `requests` when a slot frees up, so a huge backlog (or a
+    generator reading from a queue) is never materialized as tasks up front.
+    Args:
+        requests: The user requests to route.
+        max_concurrency: Maximum number of requests routed at the same time.
+        speculative: Use `aspeculative_invoke` instead of `coordinator_agent`.
+    Yields:
+        (index, result, latency_seconds) in completion order; `index` is the
+        position of the request in the input.
+    """
+    semaphore = asyncio.Semaphore(max_concurrency)
+    completed: asyncio.Queue = asyncio.Queue()
+    in_flight = set()
+
+    async def route_one(index: int, request: str) -> None:
+        start = time.perf_counter()
+        try:
+            if speculative:
+                result = await aspeculative_invoke(request)
+            else:
+                result = await coordinator_agent.ainvoke({"request": request})
+        except Exception as e:
+            result = f"An error occurred while routing request: {e}"
+        finally:
+            semaphore.release()
+        await completed.put((index, result, time.perf_counter() - start))
+
+    async def produce() -> int:
+        count = 0
+        for index, request in enumerate(requests):
+            await semaphore.acquire()
+            task = asyncio.create_task(route_one(index, request))
+            in_flight.add(task)
+            task.add_done_callback(in_flight.discard)
+            count += 1
+        return count
+
+    producer = asyncio.create_task(produce())
+    yielded = 0
+    try:
+        # While requests are still being submitted, wait on the producer too (it may fail).
+        while not producer.done():
+            getter = asyncio.ensure_future(completed.get())
+            done, _ = await asyncio.wait({getter, producer}, return_when=asyncio.FIRST_COMPLETED)
+            if getter in done:
+                yield getter.result()
+                yielded += 1
+            else:
+                getter.cancel()
+        # Every request is submitted: just drain the remaining results.
+        for _ in range(producer.result() - yielded):
+            yield await completed.get()
+    finally:
+        # Stop pulling new requests (and abandon in-flight ones) if the consumer stops early.
+        producer.cancel()
+        for task in list(in_flight):
+            task.cancel()
+
+async def route_many(requests: Iterable[str], max_concurrency: int = 16, report: bool = True,
+                     speculative: bool = False) -> List[str]:
+    """
+    Route many requests with bounded concurrency and return results in input order.
+    Args:
+        requests: The user requests to route.
+        max_concurrency: Maximum number of requests routed at the same time.
+        report: Print per-request latency percentiles when done.
+        speculative: Start likely handlers in parallel with the router call.
+    Returns:
+        The handler output for each request, in the same order as `requests`.
+    """
+    results = {}
+    latencies = []
+    start = time.perf_counter()
+    async for index, result, latency in aroute_stream(requests, max_concurrency, speculative):
+        results[index] = result
+        latencies.append(latency)
+    elapsed = time.perf_counter() - start
+
+    if report and latencies:
+        percentiles = ", ".join(f"{k}={v:.0f}ms" for k, v in latency_percentiles(latencies).items())
+        print(f"\nRouted {len(latencies)} requests in {elapsed:.2f}s "
+              f"({len(latencies) / elapsed:.1f} req/s, max_concurrency={max_concurrency}): {percentiles}")
+    return [results[i] for i in range(len(results))]
 
 # --- Example Usage ---
 def main():
-    if not llm or not coordinator_agent:
+    try:
+        get_llm(ROUTER_MODEL, temperature=0)
+    except Exception as e:
+        print(f"Error initializing language model: {e}")
         print("\nSkipping execution due to LLM initialization failure.")
         return
 
@@ -103,5 +287,18 @@ def main():
     result_c = coordinator_agent.invoke({"request": request_c})
     print(f"Final Result C: {result_c}")
 
+    print("\n--- Routing a batch of requests concurrently ---")
+    batch = [request_a, request_b, request_c, "Reserve a hotel room in Rome.", "Who wrote Hamlet?", "hello"]
+    for result in asyncio.run(route_many(batch, max_concurrency=4)):
+        print(f"Batch Result: {result}")
+
+    print("\n--- Routing with speculative handler execution ---")
+    result_d = asyncio.run(aspeculative_invoke("Can you help me plan something?"))
+    print(f"Final Result D: {result_d}")
+    print(speculation_stats.summary())
+
+    print(f"\n{decision_cache.summary()}")
+    print(fast_router.stats.summary())
+
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,58 @@
+# This code is licensed under the MIT License.
+# See the LICENSE file in the repository for the full license text.
+"""
+Lazily-initialized, process-wide registry of chat model clients.
+
+Importing `langchain_google_genai` and constructing a `ChatGoogleGenerativeAI`
+costs seconds and sets up network state, so nothing here happens at import
+time. `get_llm` builds a client on first use and returns the same instance
+(and therefore the same pooled HTTP session) for every later call with the
+same model and temperature. `lazy_llm` gives a Runnable that can be composed
+into chains at import time and only resolves the client when first invoked.
+"""
+import threading
+from typing import Any, Dict, Tuple
+
+from langchain_core.runnables import RunnableLambda
+
+DEFAULT_MODEL = "gemini-2.5-flash"
+
+_clients: Dict[Tuple[Any, ...], Any] = {}
+_lock = threading.Lock()
+
+
+def get_llm(model: str = DEFAULT_MODEL, temperature: float = 0, **kwargs):
+    """
+    Return the shared ChatGoogleGenerativeAI client for (model, temperature, kwargs).
+    The client is built on the first call; later calls reuse it.
+    """
+    key = (model, temperature, tuple(sorted(kwargs.items())))
+    client = _clients.get(key)
+    if client is not None:
+        return client
+    with _lock:
+        client = _clients.get(key)
+        if client is None:
+            from langchain_google_genai import ChatGoogleGenerativeAI
+
+            client = ChatGoogleGenerativeAI(model=model, temperature=temperature, **kwargs)
+            print(f"Language model initialized: {client.model}")
+            _clients[key] = client
+    return client
+
+
+def lazy_llm(model: str = DEFAULT_MODEL, temperature: float = 0, **kwargs) -> RunnableLambda:
+    """Return a Runnable that forwards to `get_llm(...)`, resolving the client on first invoke."""
+    def invoke(messages):
+        return get_llm(model, temperature, **kwargs).invoke(messages)
+
+    async def ainvoke(messages):
+        return await get_llm(model, temperature, **kwargs).ainvoke(messages)
+
+    return RunnableLambda(invoke, afunc=ainvoke, name=f"lazy_llm[{model}]")
+
+
+def clear_clients() -> None:
+    """Drop every cached client (e.g. after forking a worker process)."""
+    with _lock:
+        _clients.clear()
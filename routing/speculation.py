@@ -0,0 +1,108 @@
+# This code is licensed under the MIT License.
+# See the LICENSE file in the repository for the full license text.
+"""
+Speculative handler execution for the coordinator.
+
+Normally end-to-end latency is router latency + handler latency. In speculative
+mode the most likely handler(s) start at the same time as the router call;
+when the decision lands, a matching speculation is reused and the others are
+cancelled. Only speculate on handlers that are safe to run and discard
+(read-only lookups), never on handlers with real side effects.
+"""
+import asyncio
+import threading
+import time
+from typing import Awaitable, Callable, Dict, Iterable, Tuple
+
+
+class SpeculationStats:
+    """Counters for tuning speculation: wasted handler work vs. latency saved."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.speculations = 0
+        self.hits = 0
+        self.misses = 0
+        self.wasted_seconds = 0.0
+        self.saved_seconds = 0.0
+
+    def record(self, started: int, hit: bool, wasted: float, saved: float) -> None:
+        with self._lock:
+            self.requests += 1
+            self.speculations += started
+            if started:
+                if hit:
+                    self.hits += 1
+                else:
+                    self.misses += 1
+            self.wasted_seconds += wasted
+            self.saved_seconds += saved
+
+    @property
+    def hit_rate(self) -> float:
+        speculated = self.hits + self.misses
+        return self.hits / speculated if speculated else 0.0
+
+    def summary(self) -> str:
+        return (
+            f"Speculation: {self.hits}/{self.hits + self.misses} speculative requests hit "
+            f"({self.hit_rate:.0%}), {self.speculations} handlers started, "
+            f"{self.saved_seconds:.2f}s latency saved vs. {self.wasted_seconds:.2f}s wasted handler work"
+        )
+
+
+async def _timed_handler(handler: Callable[[str], str], request: str) -> Tuple[str, float]:
+    start = time.perf_counter()
+    result = await asyncio.to_thread(handler, request)
+    return result, time.perf_counter() - start
+
+
+async def run_speculative(request: str, decide: Callable[[], Awaitable[str]],
+                          handlers: Dict[str, Callable[[str], str]], guesses: Iterable[str],
+                          default: str, stats: SpeculationStats) -> Tuple[str, str]:
+    """
+    Run the router and speculative handlers concurrently.
+    Args:
+        request: The user request passed to the handler.
+        decide: Coroutine factory returning the router's decision.
+        handlers: Handler function for each label.
+        guesses: Labels to speculate on, most likely first.
+        default: Label used when the decision matches no handler.
+        stats: Counters updated with the outcome.
+    Returns:
+        (decision, handler_output)
+    """
+    started_at = time.perf_counter()
+    speculative = {
+        label: asyncio.create_task(_timed_handler(handlers[label], request))
+        for label in guesses if label in handlers
+    }
+    try:
+        decision = await decide()
+    except BaseException:
+        for task in speculative.values():
+            task.cancel()
+        raise
+    router_seconds = time.perf_counter() - started_at
+    label = decision if decision in handlers else default
+
+    # Losing speculations are cancelled. A handler already running in a worker
+    # thread cannot be interrupted, so its result is simply discarded; the time
+    # it ran up to now is what we count as wasted.
+    wasted = 0.0
+    for other, task in speculative.items():
+        if other != label:
+            finished = task.done() and not task.cancelled() and task.exception() is None
+            task.cancel()
+            wasted += task.result()[1] if finished else router_seconds
+
+    if label in speculative:
+        result, handler_seconds = await speculative[label]
+        # Serial execution would have cost router + handler; overlapping saved the smaller of the two.
+        saved = min(router_seconds, handler_seconds)
+        stats.record(len(speculative), True, wasted, saved)
+    else:
+        result, _ = await _timed_handler(handlers[label], request)
+        stats.record(len(speculative), False, wasted, 0.0)
+    return decision, result
@@ -0,0 +1,129 @@
+"""
+Long-lived async service for the tool-calling agent.
+
+`ToolAgentService` is meant to live inside an existing event loop (e.g. an
+async web server): `start()` builds the shared model client once and spawns a
+fixed pool of workers that pull queries from a bounded queue, `submit()`
+enqueues a query and awaits its answer, and `stop()` drains the queue and
+shuts the workers down. Nothing is patched globally and no loop is created.
+"""
+import asyncio
+import time
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+from langchain_core.tools import BaseTool
+
+from tool_executor import run_tool_agent
+
+
+class ToolAgentService:
+    """
+    Queue-based intake for tool-agent queries sharing one model client.
+    Args:
+        llm_factory: Returns the tool-bound chat model; called once in `start()`.
+        tools: Tools bound to the model.
+        timeouts: Per-tool timeouts in seconds, by tool name.
+        workers: Number of queries processed concurrently.
+        max_queue: Queue capacity; `submit` waits (backpressure) when it is full.
+    """
+
+    def __init__(self, llm_factory: Callable[[], Any], tools: Sequence[BaseTool],
+                 timeouts: Optional[Dict[str, float]] = None, workers: int = 32, max_queue: int = 1000):
+        self.llm_factory = llm_factory
+        self.tools = list(tools)
+        self.timeouts = timeouts
+        self.workers = workers
+        self.max_queue = max_queue
+
+        self.llm = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker_tasks: List[asyncio.Task] = []
+
+        self.processed = 0
+        self.failed = 0
+        self.latencies: List[float] = []
+
+    @property
+    def running(self) -> bool:
+        return bool(self._worker_tasks)
+
+    async def start(self) -> "ToolAgentService":
+        """Build the shared client and start the workers. Safe to call twice."""
+        if self.running:
+            return self
+        # Client construction is blocking; keep it off the loop.
+        self.llm = await asyncio.to_thread(self.llm_factory)
+        self._queue = asyncio.Queue(maxsize=self.max_queue)
+        self._worker_tasks = [asyncio.create_task(self._worker(), name=f"tool-agent-{i}")
+                              for i in range(self.workers)]
+        return self
+
+    async def stop(self, drain: bool = True) -> None:
+        """
+        Stop the workers.
+        Args:
+            drain: Finish every query already queued before stopping; otherwise
+                pending queries are cancelled.
+        """
+        if not self.running:
+            return
+        if drain:
+            await self._queue.join()
+        for task in self._worker_tasks:
+            task.cancel()
+        await asyncio.gather(*self._worker_tasks, return_exceptions=True)
+        self._worker_tasks = []
+        while not self._queue.empty():
+            _, future, _ = self._queue.get_nowait()
+            future.cancel()
+
+    async def __aenter__(self) -> "ToolAgentService":
+        return await self.start()
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.stop()
+
+    async def submit(self, query: str) -> str:
+        """Queue `query` and wait for the agent's answer."""
+        if not self.running:
+            raise RuntimeError("ToolAgentService is not running; call start() first.")
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((query, future, time.perf_counter()))
+        return await future
+
+    async def _worker(self) -> None:
+        while True:
+            query, future, enqueued_at = await self._queue.get()
+            try:
+                if future.cancelled():
+                    continue  # The caller gave up while the query was queued.
+                answer = await run_tool_agent(self.llm, query, self.tools, self.timeouts)
+                self.processed += 1
+                self.latencies.append(time.perf_counter() - enqueued_at)
+                if not future.cancelled():
+                    future.set_result(answer)
+            except asyncio.CancelledError:
+                future.cancel()
+                raise
+            except Exception as e:
+                self.failed += 1
+                if not future.cancelled():
+                    future.set_exception(e)
+            finally:
+                self._queue.task_done()
+
+    def stats(self) -> Dict[str, float]:
+        """Processed/failed counts and latency percentiles (ms), queueing included."""
+        ordered = sorted(self.latencies)
+
+        def percentile(p: float) -> float:
+            return ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))] * 1e3 if ordered else 0.0
+
+        return {
+            "processed": self.processed,
+            "failed": self.failed,
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "p50_ms": percentile(50),
+            "p95_ms": percentile(95),
+            "p99_ms": percentile(99),
+        }
@@ -1,81 +1,134 @@
 import os
 import getpass
 import asyncio
-import nest_asyncio
-from typing import List
+import threading
+from collections import OrderedDict
+from typing import List, Optional
 from dotenv import load_dotenv
 import logging
-from langchain_google_genai import ChatGoogleGenerativeAI
+from functools import lru_cache
+from llm_clients import get_llm
+from search_index import BM25Index, load_corpus
+from tool_executor import run_tool_agent
+from agent_service import ToolAgentService
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.tools import tool as langchain_tool
 
 # Load environment variables
 load_dotenv()
 
-try:
-    # A model with function/tool calling capabilities is required.
-    llm = ChatGoogleGenerativeAI(model="gemini-2.0-flash", temperature=0)
-    print(f"Language model initialized: {llm.model}")
-except Exception as e:
-    print(f"Error initializing language model: {e}")
-    llm = None
+# A model with function/tool calling capabilities is required.
+# The client is built lazily on first use (see llm_clients.py), so importing
+# this module does no network setup and runs nothing.
+TOOL_MODEL = "gemini-2.0-flash"
+
+# --- Search Backend ---
+# The BM25 index is built once per process (on first use, or eagerly via
+# load_search_index at startup) from SEARCH_CORPUS_PATH, a JSONL file of
+# {"title", "text"} documents; without it a small built-in corpus is used.
+# Results are kept in an LRU cache keyed on the normalized query.
+SEARCH_CACHE_SIZE = int(os.getenv("SEARCH_CACHE_SIZE", "4096"))
+_search_index = None
+_search_index_lock = threading.Lock()
+_search_cache: "OrderedDict[str, str]" = OrderedDict()
+
+def load_search_index(path: Optional[str] = None) -> BM25Index:
+    """Load and index the corpus, replacing any previously loaded index."""
+    global _search_index
+    _search_index = BM25Index(load_corpus(path or os.getenv("SEARCH_CORPUS_PATH")))
+    _search_cache.clear()
+    print(f"Search index loaded: {len(_search_index)} documents")
+    return _search_index
+
+def get_search_index() -> BM25Index:
+    if _search_index is None:
+        # Concurrent first lookups run in worker threads; only one should build the index.
+        with _search_index_lock:
+            if _search_index is None:
+                load_search_index()
+    return _search_index
+
+def _search(query: str) -> str:
+    hits = get_search_index().search(query, k=3)
+    if not hits:
+        return f"Simulated search result for '{query}': No specific information found, but the topic seems interesting."
+    top_score, top_doc = hits[0]
+    # A clear winner is returned on its own; otherwise give the model the top few.
+    if len(hits) == 1 or top_score >= 2 * hits[1][0]:
+        return top_doc["text"]
+    return "\n".join(f"{doc['title']}: {doc['text']}" for _, doc in hits)
 
 @langchain_tool
-def search_information(query: str) -> str:
+async def search_information(query: str) -> str:
     """
     Provides factual information on a given topic. Use this tool
     to find answers to phrases like 'capital of France' or 'weather in London?'.
     """
     print(f"\n--- Tool Called: search_information with query: '{query}' ---")
-    # Simulate a search tool with a dictionary of predefined results.
-    simulated_results = {
-        "weather in london": "The weather in London is currently cloudy with a temperature of 15°C.",
-        "capital of france": "The capital of France is Paris.",
-        "population of earth": "The estimated population of Earth is around 8 billion people.",
-        "tallest mountain": "Mount Everest is the tallest mountain above sea level.",
-        "default": f"Simulated search result for '{query}': No specific information found, but the topic seems interesting."
-    }
-    result = simulated_results.get(query.lower(), simulated_results["default"])
+    key = " ".join(query.lower().split())
+    result = _search_cache.get(key)
+    if result is not None:
+        _search_cache.move_to_end(key)
+    else:
+        # Index lookups run off the event loop so concurrent agents aren't blocked.
+        result = await asyncio.to_thread(_search, key)
+        _search_cache[key] = result
+        if len(_search_cache) > SEARCH_CACHE_SIZE:
+            _search_cache.popitem(last=False)
     print(f"--- TOOL RESULT: {result} ---")
     return result
 
 tools = [search_information]
 
 # --- Create a Tool-Calling Agent ---
-if llm:
-    # This prompt template requires an `agent_scratchpad` placeholder for the agent's internal steps.
-    agent_prompt = ChatPromptTemplate.from_messages([
-        ("system", "You are a helpful assistant."),
-        ("human", "{input}"),
-        ("placeholder", "{agent_scratchpad}"),
-    ])
-    # Bind tools to model
-    llm_with_tools = llm.bind_tools(tools)
+# This prompt template requires an `agent_scratchpad` placeholder for the agent's internal steps.
+agent_prompt = ChatPromptTemplate.from_messages([
+    ("system", "You are a helpful assistant."),
+    ("human", "{input}"),
+    ("placeholder", "{agent_scratchpad}"),
+])
+
+@lru_cache(maxsize=None)
+def get_llm_with_tools():
+    """Bind tools to the shared model client on first use."""
+    return get_llm(TOOL_MODEL, temperature=0).bind_tools(tools)
 
-async def run_agent_with_tool(query: str):
-    """Invokes the agent executor with a query and prints the final response."""
+# Per-tool timeouts (seconds) for the concurrent tool executor.
+TOOL_TIMEOUTS = {"search_information": float(os.getenv("SEARCH_TOOL_TIMEOUT", "5"))}
+
+def create_service(workers: int = 32, max_queue: int = 1000) -> ToolAgentService:
+    """Build a ToolAgentService for this agent; call `await service.start()` (or use `async with`)."""
+    return ToolAgentService(get_llm_with_tools, tools, timeouts=TOOL_TIMEOUTS,
+                            workers=workers, max_queue=max_queue)
+
+async def run_agent_with_tool(query: str, service: Optional[ToolAgentService] = None):
+    """
+    Runs the tool-calling agent on a query and prints the final response.
+    All tool calls the model makes in one turn are executed concurrently, and their
+    results are fed back to the model for the final answer. If `service` is given,
+    the query goes through its queue and shared client.
+    """
     print(f"\n--- Running Agent with Query: '{query}' ---")
     try:
-        response = await llm_with_tools.ainvoke(query)
-        if response.tool_calls:
-            for tool_call in response.tool_calls:
-                tool_result = search_information.invoke(tool_call["args"])
-                print("\n--- Final Agent Response ---")
-                print(tool_result)
+        if service is not None:
+            answer = await service.submit(query)
         else:
-            print("\n--- Final Agent Response ---")
-            print(response.content)
+            answer = await run_tool_agent(get_llm_with_tools(), query, tools, timeouts=TOOL_TIMEOUTS)
+        print("\n--- Final Agent Response ---")
+        print(answer)
     except Exception as e:
         print(f"\nAn error occurred during agent execution: {e}")
 
 async def main():
-    """Runs all agent queries concurrently."""
-    tasks = [
-        run_agent_with_tool("What is the capital of France?"),
-        run_agent_with_tool("What's the weather like in London?"),
-        run_agent_with_tool("Tell me something about dogs.")
-    ]
-    await asyncio.gather(*tasks)
+    """Runs all agent queries concurrently through one ToolAgentService."""
+    await asyncio.to_thread(load_search_index)
+    async with create_service() as service:
+        tasks = [
+            run_agent_with_tool("What is the capital of France?", service),
+            run_agent_with_tool("What's the weather like in London?", service),
+            run_agent_with_tool("Tell me something about dogs.", service)
+        ]
+        await asyncio.gather(*tasks)
 
-nest_asyncio.apply()
-asyncio.run(main())
\ No newline at end of file
+if __name__ == "__main__":
+    asyncio.run(main())
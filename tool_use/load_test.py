@@ -0,0 +1,84 @@
+"""
+Load test for ToolAgentService against a local stub model (no API key or network).
+
+The stub behaves like a tool-calling chat model: the first turn asks for one
+or more `search_information` calls, the second turn answers from the tool
+results. Each model call sleeps for a configurable latency, so the numbers
+show how well one event loop overlaps many concurrent queries.
+
+Usage:
+    python load_test.py [queries] [workers] [model_latency_ms]
+"""
+import asyncio
+import contextlib
+import io
+import random
+import sys
+import time
+
+from langchain_core.messages import AIMessage, ToolMessage
+
+from agent_service import ToolAgentService
+from langchain_tool_use import TOOL_TIMEOUTS, load_search_index, tools
+
+QUERIES = [
+    "What is the capital of France?",
+    "What's the weather like in London?",
+    "How tall is the tallest mountain?",
+    "What is the population of earth and the capital of France?",
+    "Tell me something about dogs.",
+]
+
+
+class StubToolModel:
+    """Minimal async stand-in for a tool-bound chat model."""
+
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.calls = 0
+
+    async def ainvoke(self, messages):
+        self.calls += 1
+        await asyncio.sleep(self.latency * random.uniform(0.8, 1.2))
+        tool_results = [m.content for m in messages if isinstance(m, ToolMessage)]
+        if tool_results:
+            return AIMessage(content=" ".join(tool_results))
+        query = messages[-1].content
+        # Multi-part questions produce several independent lookups in one turn.
+        parts = [p.strip(" ?") for p in query.replace(" and ", "|").split("|")]
+        return AIMessage(content="", tool_calls=[
+            {"name": "search_information", "args": {"query": part}, "id": f"call_{i}"}
+            for i, part in enumerate(parts)
+        ])
+
+
+async def run_load_test(n_queries: int = 200, workers: int = 128, latency: float = 0.1) -> dict:
+    load_search_index()
+    model = StubToolModel(latency)
+    service = ToolAgentService(lambda: model, tools, timeouts=TOOL_TIMEOUTS, workers=workers)
+    queries = [random.choice(QUERIES) for _ in range(n_queries)]
+
+    async with service:
+        start = time.perf_counter()
+        # The tool prints every call; keep the report readable.
+        with contextlib.redirect_stdout(io.StringIO()):
+            await asyncio.gather(*(service.submit(q) for q in queries))
+        elapsed = time.perf_counter() - start
+        stats = service.stats()
+
+    serial_estimate = model.calls * latency
+    print(f"{n_queries} queries, {workers} workers, stub model latency {latency * 1e3:.0f} ms")
+    print(f"Wall time: {elapsed:.2f}s -> {n_queries / elapsed:.1f} queries/s "
+          f"({model.calls} model calls; ~{serial_estimate:.1f}s if run one at a time)")
+    print(f"Latency: p50={stats['p50_ms']:.0f}ms p95={stats['p95_ms']:.0f}ms p99={stats['p99_ms']:.0f}ms, "
+          f"failed={stats['failed']}")
+    return stats
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    asyncio.run(run_load_test(
+        n_queries=int(args[0]) if len(args) > 0 else 200,
+        workers=int(args[1]) if len(args) > 1 else 128,
+        latency=float(args[2]) / 1e3 if len(args) > 2 else 0.1,
+    ))
@@ -0,0 +1,188 @@
+"""
+Local BM25 knowledge backend for the `search_information` tool.
+
+The corpus is loaded and indexed once; queries then only touch the postings of
+their own terms, so lookups stay in the low milliseconds on 100k+ documents.
+Query terms that are not in the vocabulary (typos, plurals) are expanded to
+similar vocabulary terms through a character-trigram index, which gives fuzzy
+matching without scanning the corpus. Short words share too few trigrams for
+that alone ("londn" vs "london"), so trigram candidates are also accepted
+within a small edit distance: 1 edit for 4-6 characters, 2 for longer terms.
+"""
+import heapq
+import json
+import math
+import re
+from collections import Counter, defaultdict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+_STOPWORDS = frozenset(
+    "a an and are as at be by for from has how in is it its me of on or tell that the "
+    "this to was what whats when where which who why will with like about s".split()
+)
+
+# Small built-in corpus so the tool works without any data files.
+SEED_DOCUMENTS = [
+    {"title": "Weather in London", "text": "The weather in London is currently cloudy with a temperature of 15°C."},
+    {"title": "Capital of France", "text": "The capital of France is Paris."},
+    {"title": "Population of Earth", "text": "The estimated population of Earth is around 8 billion people."},
+    {"title": "Tallest mountain", "text": "Mount Everest is the tallest mountain above sea level."},
+]
+
+
+def tokenize(text: str) -> List[str]:
+    return [t for t in _TOKEN.findall(text.lower()) if t not in _STOPWORDS]
+
+
+def _trigrams(term: str) -> set:
+    padded = f"^{term}$"
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def _max_edits(term: str) -> int:
+    """Edits tolerated for a typo of `term`: none below 4 characters, 1 up to 6, then 2."""
+    if len(term) < 4:
+        return 0
+    return 1 if len(term) <= 6 else 2
+
+
+def edit_distance(a: str, b: str, max_distance: int) -> int:
+    """
+    Optimal-string-alignment distance (insert, delete, substitute, swap adjacent),
+    giving up early: returns `max_distance + 1` once the distance must exceed it.
+    """
+    if abs(len(a) - len(b)) > max_distance:
+        return max_distance + 1
+    previous2, previous = None, list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                current[j] = min(current[j], previous2[j - 2] + 1)
+        if min(current) > max_distance:
+            return max_distance + 1
+        previous2, previous = previous, current
+    return min(previous[-1], max_distance + 1)
+
+
+def load_corpus(path: Optional[str]) -> List[Dict]:
+    """
+    Load documents from a JSONL file with 'title' and 'text' fields per line.
+    Falls back to SEED_DOCUMENTS when no path is given.
+    """
+    if not path:
+        return list(SEED_DOCUMENTS)
+    documents = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                doc = json.loads(line)
+                documents.append({"title": doc.get("title", ""), "text": doc.get("text", "")})
+    return documents
+
+
+class BM25Index:
+    """
+    Okapi BM25 over an in-memory inverted index.
+    Args:
+        documents: Dicts with 'title' and 'text'; the title is indexed with the text.
+        k1: Term-frequency saturation.
+        b: Length normalization.
+    """
+
+    def __init__(self, documents: Iterable[Dict], k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.documents: List[Dict] = []
+        self.postings: Dict[str, List[Tuple[int, int]]] = defaultdict(list)
+        self.doc_lengths: List[int] = []
+
+        for doc_id, doc in enumerate(documents):
+            self.documents.append(doc)
+            terms = tokenize(f"{doc.get('title', '')} {doc.get('text', '')}")
+            self.doc_lengths.append(len(terms))
+            for term, tf in Counter(terms).items():
+                self.postings[term].append((doc_id, tf))
+
+        n_docs = len(self.documents)
+        self.avg_length = (sum(self.doc_lengths) / n_docs) if n_docs else 0.0
+        self.idf = {
+            term: math.log(1 + (n_docs - len(posts) + 0.5) / (len(posts) + 0.5))
+            for term, posts in self.postings.items()
+        }
+        self._trigram_index: Optional[Dict[str, List[str]]] = None
+
+    def __len__(self) -> int:
+        return len(self.documents)
+
+    def _similar_terms(self, term: str, min_similarity: float = 0.5, limit: int = 3) -> List[Tuple[str, float]]:
+        """
+        Vocabulary terms similar to `term` (for typos/variants): those sharing most
+        character trigrams, or sharing any trigram and within `_max_edits` edits.
+        Similarity is the higher of trigram Jaccard and 1 - edits / length.
+        """
+        if self._trigram_index is None:
+            index = defaultdict(list)
+            for vocab_term in self.postings:
+                for gram in _trigrams(vocab_term):
+                    index[gram].append(vocab_term)
+            self._trigram_index = index
+        grams = _trigrams(term)
+        overlap = Counter(t for gram in grams for t in self._trigram_index.get(gram, ()))
+        max_edits = _max_edits(term)
+        scored = []
+        for candidate, shared in overlap.items():
+            similarity = shared / len(grams | _trigrams(candidate))
+            if similarity < min_similarity and max_edits:
+                edits = edit_distance(term, candidate, max_edits)
+                if edits <= max_edits:
+                    similarity = max(similarity, 1 - edits / max(len(term), len(candidate)))
+                    scored.append((candidate, similarity))
+                continue
+            if similarity >= min_similarity:
+                scored.append((candidate, similarity))
+        return heapq.nlargest(limit, scored, key=lambda s: s[1])
+
+    def search(self, query: str, k: int = 3, fuzzy: bool = True) -> List[Tuple[float, Dict]]:
+        """
+        Return up to `k` (score, document) pairs, best first.
+        Unknown query terms are replaced by similar vocabulary terms (weighted by
+        similarity) when `fuzzy` is set.
+        """
+        weighted_terms: Dict[str, float] = {}
+        for term in tokenize(query):
+            if term in self.postings:
+                weighted_terms[term] = max(weighted_terms.get(term, 0.0), 1.0)
+            elif fuzzy:
+                for candidate, similarity in self._similar_terms(term):
+                    weighted_terms[candidate] = max(weighted_terms.get(candidate, 0.0), similarity)
+
+        scores: Dict[int, float] = defaultdict(float)
+        for term, weight in weighted_terms.items():
+            idf = self.idf[term]
+            for doc_id, tf in self.postings[term]:
+                norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[doc_id] / self.avg_length)
+                scores[doc_id] += weight * idf * tf * (self.k1 + 1) / (tf + norm)
+
+        best = heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+        return [(score, self.documents[doc_id]) for doc_id, score in best]
+
+
+if __name__ == "__main__":
+    # Self-check on the seed corpus, including typos the trigram match alone misses.
+    index = BM25Index(SEED_DOCUMENTS)
+    checks = [
+        ("What is the capital of France?", "Capital of France"),
+        ("wether in londn", "Weather in London"),
+        ("capitol of frnace", "Capital of France"),
+        ("how tall is mount everst", "Tallest mountain"),
+    ]
+    for query, expected in checks:
+        hits = index.search(query, k=1)
+        title = hits[0][1]["title"] if hits else None
+        print(f"{'ok  ' if title == expected else 'FAIL'} {query!r} -> {title}")
+        assert title == expected, f"{query!r} should find {expected!r}, got {title!r}"
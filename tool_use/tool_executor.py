@@ -0,0 +1,92 @@
+"""
+Concurrent tool-call executor for tool-calling chat models.
+
+When a model returns several tool calls in one turn they are independent, so
+`execute_tool_calls` dispatches them all at once: async tools run natively on
+the event loop, sync tools run on a shared thread pool, and every call gets a
+timeout. `run_tool_agent` loops model turn -> concurrent tool calls -> model
+until the model answers without requesting more tools.
+"""
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Dict, List, Optional, Sequence
+
+from langchain_core.messages import BaseMessage, HumanMessage, ToolMessage
+from langchain_core.tools import BaseTool
+
+DEFAULT_TOOL_TIMEOUT = 10.0
+
+# Shared pool for sync tools, so blocking tools never stall the event loop.
+_tool_pool = ThreadPoolExecutor(max_workers=int(os.getenv("TOOL_THREAD_POOL_SIZE", "16")),
+                                thread_name_prefix="tool")
+
+
+async def _run_tool_call(call: Dict, tools_by_name: Dict[str, BaseTool], timeout: float) -> ToolMessage:
+    name = call["name"]
+    tool = tools_by_name.get(name)
+    try:
+        if tool is None:
+            raise KeyError(f"unknown tool '{name}'")
+        if getattr(tool, "coroutine", None) is not None:
+            pending = tool.ainvoke(call["args"])
+        else:
+            loop = asyncio.get_running_loop()
+            pending = loop.run_in_executor(_tool_pool, partial(tool.invoke, call["args"]))
+        content = await asyncio.wait_for(pending, timeout)
+    except asyncio.TimeoutError:
+        content = f"Error: tool '{name}' timed out after {timeout:g}s"
+    except Exception as e:
+        content = f"Error: tool '{name}' failed: {type(e).__name__}: {e}"
+    return ToolMessage(content=str(content), tool_call_id=call["id"], name=name)
+
+
+async def execute_tool_calls(tool_calls: Sequence[Dict], tools: Sequence[BaseTool],
+                             timeouts: Optional[Dict[str, float]] = None,
+                             default_timeout: float = DEFAULT_TOOL_TIMEOUT) -> List[ToolMessage]:
+    """
+    Run every tool call from one model turn concurrently.
+    Args:
+        tool_calls: The `tool_calls` of an AIMessage.
+        tools: Tools available to the model.
+        timeouts: Per-tool timeout in seconds, by tool name.
+        default_timeout: Timeout for tools not listed in `timeouts`.
+    Returns:
+        One ToolMessage per call, in the order of `tool_calls`. Failures and
+        timeouts are reported in the message content instead of raising, so the
+        model can still answer with the remaining results.
+    """
+    tools_by_name = {tool.name: tool for tool in tools}
+    timeouts = timeouts or {}
+    return list(await asyncio.gather(*(
+        _run_tool_call(call, tools_by_name, timeouts.get(call["name"], default_timeout))
+        for call in tool_calls
+    )))
+
+
+async def run_tool_agent(llm_with_tools, query: str, tools: Sequence[BaseTool],
+                         timeouts: Optional[Dict[str, float]] = None, max_turns: int = 4) -> str:
+    """
+    Answer `query`, executing each turn's tool calls concurrently and feeding the
+    results back to the model until it produces a final answer.
+    Args:
+        llm_with_tools: A chat model with the tools bound.
+        query: The user query.
+        tools: The tools bound to the model.
+        timeouts: Per-tool timeout in seconds, by tool name.
+        max_turns: Maximum number of model turns that may request tools.
+    Returns:
+        The model's final answer.
+    """
+    messages: List[BaseMessage] = [HumanMessage(content=query)]
+    for _ in range(max_turns):
+        response = await llm_with_tools.ainvoke(messages)
+        if not response.tool_calls:
+            return response.content
+        messages.append(response)
+        messages.extend(await execute_tool_calls(response.tool_calls, tools, timeouts))
+    # Out of tool turns: ask for an answer with what has been gathered.
+    messages.append(HumanMessage(content="Answer now using the tool results above."))
+    response = await llm_with_tools.ainvoke(messages)
+    return response.content